@@ -0,0 +1,45 @@
+import time
+import numpy as np
+
+from stable_baselines3.common.vec_env import DummyVecEnv, SubprocVecEnv
+
+from ddx_trading_env import TradingEnv
+from ddx_vec_env import VecTradingEnv
+from ddx_shm_vec_env import ShmVecEnv
+from ddx_rng import spawn_seeds
+
+BACKENDS = ("dummy", "subproc", "shm", "vec")
+
+
+def make_vec_env(backend, n_envs, seed=0):
+    seeds = spawn_seeds(seed, n_envs)
+    if backend == "vec":
+        return VecTradingEnv(n_envs=n_envs, seed=seed)
+    fns = [(lambda s=s: TradingEnv(seed=s)) for s in seeds]
+    return {"dummy": DummyVecEnv, "subproc": SubprocVecEnv, "shm": ShmVecEnv}[backend](fns)
+
+
+def steps_per_sec(env, steps):
+    env.reset()
+    actions = np.random.default_rng(0).integers(0, 3, size=(steps, env.num_envs))
+    start = time.perf_counter()
+    for t in range(steps):
+        env.step(actions[t])
+    return env.num_envs * steps / (time.perf_counter() - start)
+
+
+def run(quick=False):
+    """Env steps/sec for every vec backend at several env counts."""
+    env_counts = (1, 8) if quick else (1, 8, 32)
+    steps = 200 if quick else 2000
+    results = {}
+    for backend in BACKENDS:
+        for n_envs in env_counts:
+            env = make_vec_env(backend, n_envs)
+            try:
+                rate = steps_per_sec(env, steps)
+            finally:
+                env.close()
+            results[f"{backend}/{n_envs}"] = {"backend": backend, "n_envs": n_envs, "steps_per_sec": rate}
+            print(f"[DDx Bench] env {backend:7s} n_envs={n_envs:3d}: {rate:,.0f} steps/sec")
+    return results
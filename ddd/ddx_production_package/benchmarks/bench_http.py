@@ -0,0 +1,7 @@
+from edge_inference_bridge import run_benchmark
+
+
+def run(model_path, quick=False, concurrency=16, rows=1):
+    """End-to-end requests/sec and latency against a local bridge, Flask and ASGI servers."""
+    total = 500 if quick else 5000
+    return run_benchmark(model_path, [], concurrency=concurrency, total_requests=total, rows=rows)
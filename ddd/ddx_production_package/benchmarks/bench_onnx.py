@@ -0,0 +1,63 @@
+import time
+import numpy as np
+import onnx
+from onnx import helper, numpy_helper, TensorProto
+
+from edge_inference_bridge import build_session, file_sha256, session_config
+
+BATCH_SIZES = (1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024)
+
+
+def make_model(path, obs_dim=10, hidden=64, n_actions=3, seed=0):
+    """Writes an MLP with the shape of SB3's default PPO policy (2 x 64 tanh, action logits + value)."""
+    rng = np.random.default_rng(seed)
+    weights = {
+        "w1": rng.standard_normal((obs_dim, hidden)), "b1": np.zeros(hidden),
+        "w2": rng.standard_normal((hidden, hidden)), "b2": np.zeros(hidden),
+        "wa": rng.standard_normal((hidden, n_actions)), "ba": np.zeros(n_actions),
+        "wv": rng.standard_normal((hidden, 1)), "bv": np.zeros(1),
+    }
+    initializers = [numpy_helper.from_array((w * 0.1).astype(np.float32), name) for name, w in weights.items()]
+    nodes = [
+        helper.make_node("Gemm", ["obs", "w1", "b1"], ["h1_pre"]),
+        helper.make_node("Tanh", ["h1_pre"], ["h1"]),
+        helper.make_node("Gemm", ["h1", "w2", "b2"], ["h2_pre"]),
+        helper.make_node("Tanh", ["h2_pre"], ["h2"]),
+        helper.make_node("Gemm", ["h2", "wa", "ba"], ["action"]),
+        helper.make_node("Gemm", ["h2", "wv", "bv"], ["value"]),
+    ]
+    graph = helper.make_graph(
+        nodes, "ddx_bench_policy",
+        [helper.make_tensor_value_info("obs", TensorProto.FLOAT, ["batch", obs_dim])],
+        [helper.make_tensor_value_info("action", TensorProto.FLOAT, ["batch", n_actions]),
+         helper.make_tensor_value_info("value", TensorProto.FLOAT, ["batch", 1])],
+        initializers)
+    # IR version pinned to what opset 13 needs, so older onnxruntime builds can load it
+    model = helper.make_model(graph, opset_imports=[helper.make_opsetid("", 13)], ir_version=7)
+    onnx.checker.check_model(model)
+    onnx.save(model, path)
+    return path
+
+
+def run(model_path, quick=False):
+    """session.run latency (p50/p99) and rows/sec per batch size, with the bridge's session settings."""
+    sess = build_session(model_path, session_config(), file_sha256(model_path))
+    shape = sess.get_inputs()[0].shape
+    obs_dim = shape[-1] if isinstance(shape[-1], int) else 10
+    iters = 50 if quick else 500
+    rng = np.random.default_rng(0)
+    results = {}
+    for batch in BATCH_SIZES:
+        obs = rng.standard_normal((batch, obs_dim)).astype(np.float32)
+        for _ in range(10):
+            sess.run(None, {"obs": obs})
+        times = np.empty(iters)
+        for i in range(iters):
+            start = time.perf_counter()
+            sess.run(None, {"obs": obs})
+            times[i] = time.perf_counter() - start
+        p50, p99 = np.percentile(times, [50, 99]) * 1000.
+        results[str(batch)] = {"batch": batch, "p50_ms": p50, "p99_ms": p99, "rows_per_sec": batch / times.mean()}
+        print(f"[DDx Bench] onnx batch={batch:5d}: p50={p50:.3f}ms p99={p99:.3f}ms "
+              f"{results[str(batch)]['rows_per_sec']:,.0f} rows/sec")
+    return results
@@ -0,0 +1,40 @@
+import time
+
+from stable_baselines3 import PPO
+
+from bench_env import make_vec_env
+
+
+def run(quick=False, backend="dummy", n_envs=8):
+    """PPO rollout throughput (samples/sec) and time per gradient update phase."""
+    n_steps = 128 if quick else 512
+    iterations = 2 if quick else 5
+    env = make_vec_env(backend, n_envs)
+    model = PPO("MlpPolicy", env, n_steps=n_steps, batch_size=64, verbose=0, seed=0)
+    update_times = []
+    train = model.train
+
+    def timed_train():
+        start = time.perf_counter()
+        train()
+        update_times.append(time.perf_counter() - start)
+
+    model.train = timed_train
+    start = time.perf_counter()
+    model.learn(total_timesteps=n_steps * n_envs * iterations)
+    elapsed = time.perf_counter() - start
+    env.close()
+    samples = n_steps * n_envs * len(update_times)
+    rollout_time = elapsed - sum(update_times)
+    result = {
+        "backend": backend,
+        "n_envs": n_envs,
+        "n_steps": n_steps,
+        "samples": samples,
+        "samples_per_sec": samples / rollout_time,
+        "update_seconds_mean": sum(update_times) / len(update_times),
+        "total_seconds": elapsed,
+    }
+    print(f"[DDx Bench] ppo {backend} n_envs={n_envs}: {result['samples_per_sec']:,.0f} samples/sec, "
+          f"{result['update_seconds_mean'] * 1000:.0f} ms/update")
+    return result
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""DDx benchmark suite: one CLI, one JSON report.
+
+    python3 benchmarks/run.py [--suites env,train,onnx,http] [--model ddx_model.onnx]
+                              [--out bench.json] [--quick] [--compare baseline.json]
+
+Without --model, onnx and http use a generated MLP shaped like the default PPO policy.
+--compare prints each metric as a ratio to a report saved from another commit.
+"""
+import os
+import sys
+import json
+import time
+import platform
+import subprocess
+import tempfile
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, HERE)
+sys.path.insert(0, os.path.dirname(HERE))
+
+SUITES = ("env", "train", "onnx", "http")
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "HEAD"], cwd=HERE, stderr=subprocess.DEVNULL,
+                                       text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def host_info():
+    import numpy
+    import onnxruntime
+    return {
+        "cpu_count": os.cpu_count(),
+        "platform": platform.platform(),
+        "python": platform.python_version(),
+        "numpy": numpy.__version__,
+        "onnxruntime": onnxruntime.__version__,
+    }
+
+
+def flatten(results, prefix=""):
+    flat = {}
+    for key, value in results.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            flat.update(flatten(value, name + "."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[name] = value
+    return flat
+
+
+def compare(report, baseline_path):
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    old, new = flatten(baseline["results"]), flatten(report["results"])
+    print(f"[DDx Bench] vs {baseline_path} (commit {baseline.get('commit')}):")
+    for name in sorted(set(old) & set(new)):
+        if old[name]:
+            print(f"  {name:50s} {old[name]:14.4f} -> {new[name]:14.4f}  ({new[name] / old[name]:.2f}x)")
+
+
+def main():
+    suites = list(SUITES)
+    model_path = None
+    out_path = None
+    baseline_path = None
+    quick = "--quick" in sys.argv
+    if "--suites" in sys.argv:
+        idx = sys.argv.index("--suites") + 1
+        suites = sys.argv[idx].split(",")
+    if "--model" in sys.argv:
+        idx = sys.argv.index("--model") + 1
+        model_path = sys.argv[idx]
+    if "--out" in sys.argv:
+        idx = sys.argv.index("--out") + 1
+        out_path = sys.argv[idx]
+    if "--compare" in sys.argv:
+        idx = sys.argv.index("--compare") + 1
+        baseline_path = sys.argv[idx]
+    unknown = [s for s in suites if s not in SUITES]
+    if unknown:
+        raise SystemExit(f"unknown suites {unknown}, expected some of {list(SUITES)}")
+
+    tmpdir = tempfile.TemporaryDirectory()
+    if model_path is None and ("onnx" in suites or "http" in suites):
+        from bench_onnx import make_model
+        model_path = make_model(os.path.join(tmpdir.name, "bench_policy.onnx"))
+
+    report = {"commit": git_commit(), "timestamp": time.time(), "quick": quick, "host": host_info(),
+              "model": model_path, "results": {}}
+    for suite in suites:
+        start = time.perf_counter()
+        if suite == "env":
+            import bench_env
+            result = bench_env.run(quick)
+        elif suite == "train":
+            import bench_train
+            result = bench_train.run(quick)
+        elif suite == "onnx":
+            import bench_onnx
+            result = bench_onnx.run(model_path, quick)
+        else:
+            import bench_http
+            result = bench_http.run(model_path, quick)
+        report["results"][suite] = result
+        print(f"[DDx Bench] {suite} suite done in {time.perf_counter() - start:.1f}s")
+    tmpdir.cleanup()
+
+    text = json.dumps(report, indent=2)
+    if out_path:
+        with open(out_path, "w") as f:
+            f.write(text + "\n")
+        print(f"[DDx Bench] Report written to {out_path}")
+    else:
+        print(text)
+    if baseline_path:
+        compare(report, baseline_path)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,183 @@
+import os
+import copy
+import glob
+import queue
+import random
+import threading
+
+import numpy as np
+import torch
+from stable_baselines3.common.callbacks import BaseCallback
+from stable_baselines3.common.vec_env import VecEnvWrapper, VecNormalize
+
+from ddx_vec_env import VecTradingEnv
+
+CHECKPOINT_GLOB = "ckpt_*.pt"
+
+
+def checkpoint_path(directory, num_timesteps):
+    return os.path.join(directory, f"ckpt_{num_timesteps:012d}.pt")
+
+
+def list_checkpoints(directory):
+    # Oldest first; the zero-padded step count makes name order step order
+    return sorted(glob.glob(os.path.join(directory, CHECKPOINT_GLOB)))
+
+
+def latest_checkpoint(directory):
+    paths = list_checkpoints(directory)
+    return paths[-1] if paths else None
+
+
+def _base_env(env):
+    while isinstance(env, VecEnvWrapper):
+        env = env.venv
+    return env
+
+
+def _find_normalize(env):
+    while isinstance(env, VecEnvWrapper):
+        if isinstance(env, VecNormalize):
+            return env
+        env = env.venv
+    return None
+
+
+def capture_env_rngs(env):
+    # Each env's BlockRNG (Generator state plus unread buffer), so a resumed run keeps drawing new episodes
+    base = _base_env(env)
+    if isinstance(base, VecTradingEnv):
+        return {"rng": base.rng, "rngs": base.rngs}
+    return {"rngs": base.get_attr("rng")}
+
+
+def restore_env_rngs(env, state):
+    base = _base_env(env)
+    if isinstance(base, VecTradingEnv):
+        base.rng, base.rngs = state["rng"], state["rngs"]
+        return
+    for i, rng in enumerate(state["rngs"]):
+        base.set_attr("rng", rng, indices=i)
+        base.set_attr("np_random", rng.generator, indices=i)
+
+
+def capture(model):
+    """Consistent in-memory copy of everything needed to resume `model` (taken on the training thread)."""
+    norm = _find_normalize(model.get_env())
+    return {
+        "num_timesteps": model.num_timesteps,
+        "n_updates": model._n_updates,
+        "policy": {k: v.detach().cpu().clone() for k, v in model.policy.state_dict().items()},
+        "optimizer": copy.deepcopy(model.policy.optimizer.state_dict()),
+        "normalize": None if norm is None else {"obs_rms": copy.deepcopy(norm.obs_rms),
+                                                "ret_rms": copy.deepcopy(norm.ret_rms)},
+        "rng": {
+            "torch": torch.get_rng_state(),
+            "numpy": np.random.get_state(),
+            "python": random.getstate(),
+            "envs": copy.deepcopy(capture_env_rngs(model.get_env())),
+        },
+    }
+
+
+def restore(model, state):
+    model.policy.load_state_dict(state["policy"])
+    model.policy.optimizer.load_state_dict(state["optimizer"])
+    model.num_timesteps = state["num_timesteps"]
+    model._n_updates = state["n_updates"]
+    norm = _find_normalize(model.get_env())
+    if state["normalize"] is not None:
+        if norm is None:
+            raise ValueError("checkpoint has normalization stats but the env is not wrapped in VecNormalize")
+        norm.obs_rms, norm.ret_rms = state["normalize"]["obs_rms"], state["normalize"]["ret_rms"]
+    rng = state["rng"]
+    torch.set_rng_state(rng["torch"])
+    np.random.set_state(rng["numpy"])
+    random.setstate(rng["python"])
+    restore_env_rngs(model.get_env(), rng["envs"])
+
+
+def load_checkpoint(path):
+    return torch.load(path, map_location="cpu", weights_only=False)
+
+
+class CheckpointWriter:
+    """Writes checkpoints on a background thread and keeps the newest `keep` of them.
+
+    save() only enqueues. The queue holds one snapshot, so if writes fall
+    behind, save() blocks rather than letting snapshots pile up in memory.
+    close() raises if the newest snapshot could not be written.
+    """
+
+    def __init__(self, directory, keep=3):
+        if keep < 1:
+            raise ValueError(f"keep must be at least 1, got {keep}")
+        self.directory = directory
+        self.keep = keep
+        os.makedirs(directory, exist_ok=True)
+        self.queue = queue.Queue(maxsize=1)
+        self.last_error = None
+        self.thread = threading.Thread(target=self._loop, daemon=True)
+        self.thread.start()
+
+    def save(self, state, extra=None):
+        self.queue.put({**state, **(extra or {})})
+
+    def _loop(self):
+        while True:
+            state = self.queue.get()
+            if state is None:
+                return
+            try:
+                self._write(state)
+                self.last_error = None
+            except Exception as exc:
+                self.last_error = exc
+                print(f"[DDx RL Train] Checkpoint write failed: {type(exc).__name__}: {exc}")
+            finally:
+                self.queue.task_done()
+
+    def _write(self, state):
+        path = checkpoint_path(self.directory, state["num_timesteps"])
+        tmp = path + ".tmp"
+        torch.save(state, tmp)
+        os.replace(tmp, path)
+        for old in list_checkpoints(self.directory)[:-self.keep]:
+            os.remove(old)
+        print(f"[DDx RL Train] Checkpoint {path}")
+
+    def close(self):
+        self.queue.put(None)
+        self.thread.join()
+        if self.last_error is not None:
+            raise RuntimeError(f"the last checkpoint could not be written to {self.directory}, "
+                               f"so the run can't be resumed from it") from self.last_error
+
+
+class CheckpointCallback(BaseCallback):
+    # Snapshots the model every `every` timesteps and hands it to a CheckpointWriter
+    def __init__(self, writer, every, extra=None):
+        super().__init__()
+        self.writer = writer
+        self.every = every
+        self.extra = extra
+        self.last_saved = 0
+
+    def _on_training_start(self):
+        self.last_saved = self.model.num_timesteps
+
+    def _on_step(self):
+        return True
+
+    def _on_rollout_start(self):
+        # The previous rollout has been trained on by now, so every counted timestep is in the weights
+        if self.model.num_timesteps - self.last_saved >= self.every:
+            self.save()
+
+    def _on_training_end(self):
+        if self.model.num_timesteps > self.last_saved:
+            self.save()
+
+    def save(self):
+        self.writer.save(capture(self.model), self.extra)
+        self.last_saved = self.model.num_timesteps
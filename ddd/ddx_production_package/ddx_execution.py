@@ -0,0 +1,96 @@
+import sys
+import time
+import numpy as np
+
+# (cumulative traded notional, taker fee in bps): the fee drops as episode volume crosses each threshold
+DEFAULT_FEE_TIERS = ((0., 10.), (1e6, 8.), (5e6, 6.), (2.5e7, 4.))
+
+
+class ExecutionModel:
+    """Positions, cash and fills for N envs, kept in NumPy arrays.
+
+    Each step an env asks for a target position (in base units). The difference
+    is filled as a market order at the bar's price, paying half the spread, a
+    square-root volume impact (`impact * sqrt(|qty| / (bar_volume + 1))`) and a taker
+    fee looked up from `fee_tiers` by the env's traded notional so far. Holdings
+    are then marked to market and the change in equity is the step's PnL.
+    Every method works on whole arrays, so one env (n_envs=1) and a vectorized
+    batch share the same code.
+    """
+
+    def __init__(self, n_envs=1, capital=10_000., fee_tiers=DEFAULT_FEE_TIERS, half_spread_bps=1., impact=0.02):
+        self.n_envs = n_envs
+        self.capital = capital
+        self.fee_thresholds = np.array([t for t, _ in fee_tiers], dtype=np.float64)
+        self.fee_rates = np.array([bps for _, bps in fee_tiers], dtype=np.float64) * 1e-4
+        self.half_spread = half_spread_bps * 1e-4
+        self.impact = impact
+        self.position = np.zeros(n_envs)
+        self.cash = np.full(n_envs, capital)
+        self.equity = np.full(n_envs, capital)
+        self.traded = np.zeros(n_envs)
+        self.costs = np.zeros(n_envs)
+        # Spread + fee per unit notional and the notional at which each env's next fee tier starts;
+        # only recomputed when an env crosses a tier, not every step
+        self.cost_rate = np.empty(n_envs)
+        self.next_tier = np.empty(n_envs)
+        self._update_tiers()
+
+    def reset(self, idx=slice(None)):
+        self.position[idx] = 0.
+        self.cash[idx] = self.capital
+        self.equity[idx] = self.capital
+        self.traded[idx] = 0.
+        self.costs[idx] = 0.
+        self._update_tiers()
+
+    def _update_tiers(self):
+        tier = np.searchsorted(self.fee_thresholds, self.traded, side="right") - 1
+        self.cost_rate[:] = self.half_spread + self.fee_rates[tier]
+        self.next_tier[:] = np.append(self.fee_thresholds, np.inf)[tier + 1]
+
+    def execute(self, target, price, volume=None):
+        """Trades every env to `target` at `price`; returns the cost paid by each (spread + impact + fee)."""
+        trade = target - self.position
+        size = np.abs(trade)
+        cost_rate = self.cost_rate
+        if volume is not None:
+            cost_rate = cost_rate + self.impact * np.sqrt(size / (volume + 1.))
+        notional = size * price
+        cost = notional * cost_rate
+        self.cash -= trade * price + cost
+        self.position[:] = target
+        self.traded += notional
+        self.costs += cost
+        if (self.traded >= self.next_tier).any():
+            self._update_tiers()
+        return cost
+
+    def mark(self, price):
+        """Marks positions to `price`; returns each env's PnL since the last mark."""
+        equity = self.cash + self.position * price
+        pnl = equity - self.equity
+        self.equity = equity
+        return pnl
+
+
+def benchmark(steps=20000):
+    for n_envs in (1, 64):
+        sim = ExecutionModel(n_envs)
+        prices = 100. * np.exp(np.cumsum(np.random.normal(0., 0.001, (steps + 1, n_envs)), axis=0))
+        targets = np.random.randint(-1, 2, size=(steps, n_envs)).astype(np.float64)
+        volume = np.full(n_envs, 1e4)
+        start = time.perf_counter()
+        for t in range(steps):
+            sim.execute(targets[t], prices[t], volume)
+            sim.mark(prices[t + 1])
+        per_step = (time.perf_counter() - start) / steps * 1e6
+        print(f"[DDx Execution] n_envs={n_envs}: {per_step:.2f} us/step ({per_step / n_envs:.3f} us/env-step)")
+
+
+if __name__ == "__main__":
+    steps = 20000
+    if "--steps" in sys.argv:
+        idx = sys.argv.index("--steps") + 1
+        steps = int(sys.argv[idx])
+    benchmark(steps)
@@ -0,0 +1,218 @@
+import os
+import sys
+import json
+import time
+
+import numpy as np
+import onnx
+import onnxruntime as ort
+import torch
+from gymnasium import spaces
+
+OPSET = 13
+OUTPUT_NAMES = ("action",)
+HEAD_NAMES = ("action", "logits", "value")
+PARITY_SAMPLES = 4096
+PARITY_ATOL = 1e-4
+PARITY_RTOL = 1e-3
+# Integer actions may only differ where the argmax of near-tied logits flips within float tolerance
+PARITY_MAX_DISAGREEMENT = 1e-3
+
+
+class Actor(torch.nn.Module):
+    """Deterministic actor of an SB3 ActorCriticPolicy: obs -> action.
+
+    `policy.forward` samples from the action distribution and runs the value
+    head, neither of which serving needs. This keeps the actor MLP and the
+    action head and takes the argmax inside the graph, so discrete policies
+    return int64 actions ([N], or [N, K] per asset for MultiDiscrete). Box
+    policies return their mean clipped to the action bounds. With `heads=True`
+    the logits and value are also returned, for clients that ask for them.
+
+    Given the training VecNormalize as `normalize`, its statistics are folded
+    in as a prefix (subtract the mean, divide by the std, clip), so the graph
+    takes raw observations.
+    """
+
+    def __init__(self, policy, heads=False, normalize=None):
+        super().__init__()
+        self.policy = policy
+        self.heads = heads
+        self.clip_obs = None
+        if normalize is not None:
+            rms = normalize.obs_rms
+            self.register_buffer("obs_mean", torch.as_tensor(rms.mean, dtype=torch.float32))
+            std = np.sqrt(rms.var + normalize.epsilon)
+            self.register_buffer("obs_std", torch.as_tensor(std, dtype=torch.float32))
+            self.clip_obs = float(normalize.clip_obs)
+        space = policy.action_space
+        self.nvec = [int(space.n)] if isinstance(space, spaces.Discrete) else None
+        if isinstance(space, spaces.MultiDiscrete):
+            self.nvec = [int(n) for n in space.nvec]
+        if isinstance(space, spaces.Box):
+            self.register_buffer("low", torch.as_tensor(space.low, dtype=torch.float32))
+            self.register_buffer("high", torch.as_tensor(space.high, dtype=torch.float32))
+
+    def forward(self, obs):
+        if self.clip_obs is not None:
+            obs = torch.clamp((obs - self.obs_mean) / self.obs_std, -self.clip_obs, self.clip_obs)
+        features = self.policy.extract_features(obs)
+        pi_features = features[0] if isinstance(features, tuple) else features
+        logits = self.policy.action_net(self.policy.mlp_extractor.forward_actor(pi_features))
+        if self.nvec is None:
+            action = torch.max(torch.min(logits, self.high), self.low)
+        elif len(self.nvec) == 1:
+            action = torch.argmax(logits, dim=1)
+        else:
+            action = torch.stack([torch.argmax(l, dim=1) for l in torch.split(logits, self.nvec, dim=1)], dim=1)
+        if not self.heads:
+            return action
+        vf_features = features[1] if isinstance(features, tuple) else features
+        value = self.policy.value_net(self.policy.mlp_extractor.forward_critic(vf_features))
+        return action, logits, value
+
+
+def ort_path(path):
+    return os.path.splitext(path)[0] + ".ort"
+
+
+def policy_metadata(policy, action_names, normalize=None):
+    """Model metadata the bridge validates requests against and sizes its input buffers from.
+
+    obs_shape/obs_dim describe one observation; action_type is "discrete"
+    (with action_mapping from index to name) or "weights" for Box policies;
+    normalization holds the VecNormalize statistics when `normalize` is given,
+    marked as folded into the graph (clients send raw observations).
+    """
+    shape = [int(d) for d in policy.observation_space.shape]
+    props = {"obs_shape": json.dumps(shape), "obs_dim": str(int(np.prod(shape)))}
+    if isinstance(policy.action_space, spaces.Box):
+        props["action_type"] = "weights"
+    else:
+        props["action_type"] = "discrete"
+        props["action_mapping"] = json.dumps({str(i): name for i, name in enumerate(action_names)})
+    if normalize is not None:
+        props["normalization"] = json.dumps({
+            "mean": normalize.obs_rms.mean.tolist(),
+            "var": normalize.obs_rms.var.tolist(),
+            "epsilon": normalize.epsilon,
+            "clip_obs": normalize.clip_obs,
+            "folded": True,
+        })
+    return props
+
+
+def export_onnx(module, sample_obs, path, props=None, output_names=OUTPUT_NAMES):
+    # The TorchScript exporter writes opset 13 directly, which the bridge's ORT builds all load.
+    # Every input and output has a symbolic batch dimension.
+    torch.onnx.export(
+        module,
+        torch.as_tensor(sample_obs[:1], dtype=torch.float32),
+        path,
+        export_params=True,
+        opset_version=OPSET,
+        do_constant_folding=True,
+        input_names=["obs"],
+        output_names=list(output_names),
+        dynamic_axes={name: {0: "batch"} for name in ("obs",) + tuple(output_names)},
+        dynamo=False,
+    )
+    model = onnx.load(path)
+    if props:
+        onnx.helper.set_model_props(model, props)
+    onnx.save(model, path)
+
+
+def check_onnx(path, output_names=OUTPUT_NAMES):
+    """Runs the ONNX checker and stores inferred shapes for every intermediate value in the file."""
+    onnx.checker.check_model(path, full_check=True)
+    onnx.shape_inference.infer_shapes_path(path, check_type=True, strict_mode=True)
+    outputs = [o.name for o in onnx.load(path).graph.output]
+    if outputs != list(output_names):
+        raise ValueError(f"{path}: graph outputs are {outputs}, expected {list(output_names)}")
+
+
+def optimize_ort(path, out_path=None):
+    """Saves `path` with ORT's constant folding and node fusions applied, in ORT format.
+
+    Extended rather than "all": the layout transforms of the highest level are
+    specific to the CPU that ran them, so the file would not be portable.
+    """
+    out_path = out_path or ort_path(path)
+    opts = ort.SessionOptions()
+    opts.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_EXTENDED
+    opts.optimized_model_filepath = out_path
+    opts.add_session_config_entry("session.save_model_format", "ORT")
+    ort.InferenceSession(path, sess_options=opts, providers=["CPUExecutionProvider"])
+    return out_path
+
+
+def run_session(sess, obs):
+    # Runs obs through the session in chunks of its batch dimension (all at once if it is dynamic)
+    batch = sess.get_inputs()[0].shape[0]
+    step = batch if isinstance(batch, int) and batch > 0 else len(obs)
+    chunks = [sess.run(None, {"obs": obs[i:i + step]}) for i in range(0, len(obs), step)]
+    return [np.concatenate(parts) for parts in zip(*chunks)]
+
+
+def check_parity(module, path, obs, atol=PARITY_ATOL, rtol=PARITY_RTOL,
+                 max_disagreement=PARITY_MAX_DISAGREEMENT):
+    """Compares every output of the model at `path` with `module` on `obs`.
+
+    Returns the max abs diff per float output and the fraction of differing
+    values per integer output.
+    """
+    with torch.no_grad():
+        expected = module(torch.as_tensor(obs, dtype=torch.float32))
+    expected = [t.numpy() for t in (expected if isinstance(expected, tuple) else (expected,))]
+    sess = ort.InferenceSession(path, providers=["CPUExecutionProvider"])
+    actual = run_session(sess, obs)
+    diffs = {}
+    for out, want, got in zip(sess.get_outputs(), expected, actual):
+        got = got.reshape(want.shape)
+        if np.issubdtype(want.dtype, np.integer):
+            diffs[out.name] = float(np.mean(got != want))
+            ok = diffs[out.name] <= max_disagreement
+        else:
+            diffs[out.name] = float(np.max(np.abs(got - want)))
+            ok = np.allclose(got, want, atol=atol, rtol=rtol)
+        if not ok:
+            raise ValueError(f"{path}: output {out.name!r} differs from the PyTorch policy "
+                             f"(diff {diffs[out.name]:.3g}, atol={atol}, rtol={rtol}, "
+                             f"max_disagreement={max_disagreement})")
+    return diffs
+
+
+def sample_observations(obs, n=PARITY_SAMPLES, seed=0):
+    # Up to n distinct rows of a [..., *obs_shape] batch, e.g. the last rollout buffer
+    idx = np.random.default_rng(seed).permutation(len(obs))[:n]
+    return np.ascontiguousarray(obs[np.sort(idx)], dtype=np.float32)
+
+
+def export_policy(policy, obs, path, props=None, heads=False, normalize=None):
+    """Exports `policy`'s actor, verifies the graph and its outputs on `obs`, and saves an optimized .ort copy.
+
+    With `normalize` (the training VecNormalize) the graph normalizes raw
+    observations itself, and `obs` must be raw. Returns the path of the .ort
+    file. Raises ValueError if either file's outputs don't match the PyTorch policy.
+    """
+    module = Actor(policy, heads=heads, normalize=normalize).eval()
+    output_names = HEAD_NAMES if heads else OUTPUT_NAMES
+    start = time.perf_counter()
+    export_onnx(module, obs, path, props, output_names)
+    check_onnx(path, output_names)
+    optimized = optimize_ort(path)
+    for p in (path, optimized):
+        diffs = check_parity(module, p, obs)
+        print(f"[DDx Export] {p}: {os.path.getsize(p):,} bytes, parity on {len(obs)} observations, "
+              + ", ".join(f"{k} diff {v:.2g}" for k, v in diffs.items()))
+    print(f"[DDx Export] Exported and verified in {time.perf_counter() - start:.2f}s")
+    return optimized
+
+
+if __name__ == "__main__":
+    # Checks an existing ONNX model and writes its ORT-optimized copy next to it
+    if len(sys.argv) < 2:
+        raise SystemExit("usage: python3 ddx_export.py <model.onnx>")
+    check_onnx(sys.argv[1], [o.name for o in onnx.load(sys.argv[1]).graph.output])
+    print(f"[DDx Export] {optimize_ort(sys.argv[1])}")
@@ -0,0 +1,202 @@
+import os
+import sys
+import json
+import time
+import numpy as np
+
+from ddx_market_data import MarketData
+
+# Bump FEATURE_SET_VERSION whenever a feature's definition changes. It is
+# stored in the feature store manifest and in the exported ONNX model, and the
+# inference bridge rejects requests built for a different feature set.
+FEATURE_SET_VERSION = "v1"
+FEATURES = (
+    "ret_1", "ret_5", "ret_20",     # log returns over 1/5/20 bars
+    "vol_20", "vol_60",             # rolling std of 1-bar log returns
+    "rsi_14",                       # simple-average RSI rescaled to [-1, 1]
+    "zscore_20", "zscore_60",       # close vs. its rolling mean, in rolling stds
+    "ofi_20",                       # order-flow imbalance proxy in [-1, 1]
+    "volume_z_20",                  # log-volume z-score
+)
+# Bars of history a row depends on (longest chain: vol_60 over 1-bar returns)
+LOOKBACK = 64
+EPS = 1e-12
+
+MANIFEST = "features.json"
+MATRIX = "features.f32"
+
+
+def _shift(x, k):
+    out = np.empty_like(x)
+    out[k:] = x[:-k]
+    out[:k] = x[0]
+    return out
+
+
+def _rolling_sum(x, w):
+    c = np.cumsum(x, dtype=np.float64)
+    out = np.empty_like(c)
+    out[:w] = c[:w]
+    out[w:] = c[w:] - c[:-w]
+    return out
+
+
+def _rolling_mean(x, w):
+    return _rolling_sum(x, w) / w
+
+
+def _rolling_std(x, w):
+    # Centre first so the cumulative sums stay small and E[x^2] - E[x]^2 keeps its precision
+    x = x - x[0]
+    mean = _rolling_mean(x, w)
+    return np.sqrt(np.maximum(_rolling_mean(x * x, w) - mean * mean, 0.))
+
+
+def compute_features(bars):
+    """Vectorized feature matrix [T, len(FEATURES)] float32 for a dict of bar columns.
+
+    Row t only uses bars <= t. The first LOOKBACK rows lack full windows and are zero.
+    """
+    close = np.asarray(bars["close"], dtype=np.float64)
+    open_ = np.asarray(bars["open"], dtype=np.float64) if "open" in bars else _shift(close, 1)
+    high = np.asarray(bars["high"], dtype=np.float64) if "high" in bars else np.maximum(open_, close)
+    low = np.asarray(bars["low"], dtype=np.float64) if "low" in bars else np.minimum(open_, close)
+    volume = np.asarray(bars["volume"], dtype=np.float64) if "volume" in bars else np.ones_like(close)
+
+    log_close = np.log(close)
+    ret_1 = log_close - _shift(log_close, 1)
+    gains = _rolling_mean(np.maximum(ret_1, 0.), 14)
+    losses = _rolling_mean(np.maximum(-ret_1, 0.), 14)
+    # Sign each bar's volume by where the close sits in the bar (+1 at the open->high side)
+    direction = np.clip((close - open_) / np.maximum(high - low, EPS), -1., 1.)
+    log_volume = np.log1p(volume)
+
+    columns = [
+        ret_1,
+        log_close - _shift(log_close, 5),
+        log_close - _shift(log_close, 20),
+        _rolling_std(ret_1, 20),
+        _rolling_std(ret_1, 60),
+        (gains - losses) / (gains + losses + EPS),
+        (close - _rolling_mean(close, 20)) / (_rolling_std(close, 20) + EPS),
+        (close - _rolling_mean(close, 60)) / (_rolling_std(close, 60) + EPS),
+        _rolling_sum(direction * volume, 20) / (_rolling_sum(volume, 20) + EPS),
+        (log_volume - _rolling_mean(log_volume, 20)) / (_rolling_std(log_volume, 20) + EPS),
+    ]
+    matrix = np.stack(columns, axis=1).astype(np.float32)
+    matrix[:LOOKBACK] = 0.
+    return np.nan_to_num(matrix, copy=False, nan=0., posinf=0., neginf=0.)
+
+
+def compute_rows(bars, start, stop):
+    # Rows [start, stop) computed from just enough history before `start`
+    ctx = max(0, start - LOOKBACK)
+    window = {name: col[ctx:stop] for name, col in bars.items()}
+    return compute_features(window)[start - ctx:]
+
+
+class FeatureStore:
+    """Precomputed observation features: a raw float32 [n_rows, n_features] file plus a JSON manifest.
+
+    The matrix is memory-mapped, so envs just index rows by timestep.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        with open(os.path.join(directory, MANIFEST)) as f:
+            self.manifest = json.load(f)
+        self.version = self.manifest["version"]
+        self.features = tuple(self.manifest["features"])
+        self.lookback = self.manifest["lookback"]
+        self.n_rows = self.manifest["n_rows"]
+        self.matrix = np.memmap(os.path.join(directory, MATRIX), dtype=np.float32, mode="r",
+                                shape=(self.n_rows, len(self.features)))
+
+    @property
+    def n_features(self):
+        return len(self.features)
+
+    def check_compatible(self):
+        if self.version != FEATURE_SET_VERSION or self.features != FEATURES:
+            raise ValueError(f"feature store {self.directory} has feature set {self.version}, code expects "
+                             f"{FEATURE_SET_VERSION}; rebuild it with ddx_features.py")
+
+    def row(self, t):
+        return self.matrix[t]
+
+    def gather_rows(self, t, out=None):
+        return np.take(self.matrix, t, axis=0, out=out, mode="clip")
+
+
+def open_feature_store(features, data):
+    """Opens `features` (a FeatureStore or its directory) and checks it covers `data`."""
+    if isinstance(features, str):
+        features = FeatureStore(features)
+    features.check_compatible()
+    if data is None:
+        raise ValueError("a feature store needs the market data it was built from (for prices)")
+    if features.n_rows < data.n_bars:
+        raise ValueError(f"feature store {features.directory} covers {features.n_rows} of {data.n_bars} bars; "
+                         f"run ddx_features.py to append the new rows")
+    return features
+
+
+def _write_manifest(directory, n_rows, n_bars_source):
+    manifest = {
+        "version": FEATURE_SET_VERSION,
+        "features": list(FEATURES),
+        "lookback": LOOKBACK,
+        "n_rows": n_rows,
+        "source_bars": n_bars_source,
+        "updated_at": time.time(),
+    }
+    tmp = os.path.join(directory, f".{MANIFEST}.tmp")
+    with open(tmp, "w") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp, os.path.join(directory, MANIFEST))
+
+
+def update_feature_store(data_dir, out_dir=None):
+    """Brings the feature store in `out_dir` (default: the data dir) up to date with the bars.
+
+    Only rows for bars appended since the last run are computed and appended;
+    a store built for another feature set version is rebuilt from scratch.
+    Returns (rows_total, rows_written).
+    """
+    out_dir = out_dir or data_dir
+    os.makedirs(out_dir, exist_ok=True)
+    data = MarketData(data_dir)
+    bars = data.columns
+    matrix_path = os.path.join(out_dir, MATRIX)
+    start = 0
+    if os.path.exists(os.path.join(out_dir, MANIFEST)):
+        try:
+            store = FeatureStore(out_dir)
+            store.check_compatible()
+            start = min(store.n_rows, data.n_bars)
+        except (ValueError, KeyError, OSError) as exc:
+            print(f"[DDx Features] Rebuilding feature store: {exc}")
+            start = 0
+    row_bytes = len(FEATURES) * 4
+    with open(matrix_path, "ab" if start else "wb") as f:
+        # Drop anything past the manifest's row count (e.g. an append interrupted before the manifest update)
+        f.truncate(start * row_bytes)
+        chunk = 1 << 20
+        for lo in range(start, data.n_bars, chunk):
+            hi = min(lo + chunk, data.n_bars)
+            f.write(compute_rows(bars, lo, hi).tobytes())
+    _write_manifest(out_dir, data.n_bars, data.n_bars)
+    return data.n_bars, data.n_bars - start
+
+
+if __name__ == "__main__":
+    # python3 ddx_features.py <market_data_dir> [--out DIR]
+    data_dir = sys.argv[1] if len(sys.argv) > 1 else "market_data"
+    out_dir = None
+    if "--out" in sys.argv:
+        idx = sys.argv.index("--out") + 1
+        out_dir = sys.argv[idx]
+    start = time.perf_counter()
+    total, written = update_feature_store(data_dir, out_dir)
+    print(f"[DDx Features] Feature set {FEATURE_SET_VERSION}: {written:,} new rows computed, "
+          f"{total:,} total, in {time.perf_counter() - start:.2f}s")
@@ -0,0 +1,132 @@
+import os
+import sys
+import time
+import numpy as np
+
+OHLCV_COLUMNS = ("open", "high", "low", "close", "volume")
+
+
+class MarketData:
+    """Read-only bar history, memory-mapped column by column.
+
+    `path` is either a directory of per-column `.npy` files (`close.npy`,
+    `volume.npy`, ...; see write_columns) or an Arrow IPC/Feather file
+    (`columns` wraps arrays already in memory instead). Nothing
+    is read eagerly: columns are np.memmap / Arrow buffers backed by the page
+    cache, so every env and worker process that opens the same history shares
+    the same physical pages, and opening a multi-GB history costs a header read.
+    """
+
+    def __init__(self, path, window=10, columns=None):
+        self.path = path
+        self.window = window
+        if columns is not None:
+            self.columns = columns
+        elif os.path.isdir(path):
+            self.columns = load_npy_columns(path)
+        elif path.endswith((".arrow", ".feather", ".ipc")):
+            self.columns = load_arrow_columns(path)
+        else:
+            raise ValueError(f"unsupported market data path {path!r}: expected a directory of .npy columns or an Arrow file")
+        missing = [c for c in ("close",) if c not in self.columns]
+        if missing:
+            raise ValueError(f"market data at {path!r} is missing columns {missing}")
+        lengths = {len(col) for col in self.columns.values()}
+        if len(lengths) != 1:
+            raise ValueError(f"market data columns have different lengths: {sorted(lengths)}")
+        self.n_bars = lengths.pop()
+
+    def __getitem__(self, column):
+        return self.columns[column]
+
+    def sample_start(self, rng, episode_len, min_t=0):
+        # First usable bar needs a full window behind it and episode_len bars ahead
+        low, high = max(self.window - 1, min_t), self.n_bars - episode_len - 1
+        if high <= low:
+            raise ValueError(f"history of {self.n_bars} bars is too short for window={self.window}, "
+                             f"episode_len={episode_len}")
+        return int(rng.integers(low, high)) if hasattr(rng, "integers") else int(rng.randint(low, high))
+
+    def window_view(self, column, t):
+        # Zero-copy slice of the memory-mapped column ending at bar t (inclusive)
+        return self.columns[column][t - self.window + 1:t + 1]
+
+    def gather_windows(self, column, t, out=None):
+        # Batched windows for many envs at once: out[i] = column[t[i]-window+1 : t[i]+1]
+        offsets = np.arange(1 - self.window, 1)
+        if out is None:
+            out = np.empty((len(t), self.window), dtype=self.columns[column].dtype)
+        np.take(self.columns[column], t[:, None] + offsets, out=out, mode="clip")
+        return out
+
+
+def load_npy_columns(directory):
+    columns = {}
+    for name in sorted(os.listdir(directory)):
+        if name.endswith(".npy"):
+            col = np.load(os.path.join(directory, name), mmap_mode="r")
+            if col.ndim != 1:
+                raise ValueError(f"column file {name} must be 1-D, got shape {col.shape}")
+            columns[name[:-4]] = col
+    return columns
+
+
+def load_arrow_columns(path):
+    try:
+        import pyarrow as pa
+    except ImportError:
+        raise ImportError("reading Arrow market data requires pyarrow (pip install pyarrow)")
+    source = pa.memory_map(path, "r")
+    try:
+        table = pa.ipc.open_file(source).read_all()
+    except pa.ArrowInvalid:
+        table = pa.ipc.open_stream(source).read_all()
+    columns = {}
+    for name in table.column_names:
+        chunked = table.column(name)
+        if chunked.num_chunks != 1 or chunked.null_count:
+            raise ValueError(f"Arrow column {name!r} must be a single null-free chunk to be mapped without copying")
+        columns[name] = chunked.chunk(0).to_numpy(zero_copy_only=True)
+    return columns
+
+
+def write_columns(directory, **columns):
+    """Writes each array as `<directory>/<name>.npy` (float32 unless integer)."""
+    os.makedirs(directory, exist_ok=True)
+    for name, values in columns.items():
+        values = np.asarray(values)
+        if not np.issubdtype(values.dtype, np.integer):
+            values = values.astype(np.float32)
+        tmp = os.path.join(directory, f".{name}.npy.tmp")
+        with open(tmp, "wb") as f:
+            np.save(f, values)
+        os.replace(tmp, os.path.join(directory, f"{name}.npy"))
+
+
+def synthetic_ohlcv(n_bars, seed=0, start_price=100.):
+    # Geometric random walk, handy for smoke tests and benchmarks
+    rng = np.random.default_rng(seed)
+    close = start_price * np.exp(np.cumsum(rng.normal(0., 0.001, n_bars)))
+    open_ = np.concatenate([[start_price], close[:-1]])
+    spread = np.abs(rng.normal(0., 0.0005, n_bars)) * close
+    high = np.maximum(open_, close) + spread
+    low = np.minimum(open_, close) - spread
+    volume = rng.lognormal(10., 0.5, n_bars)
+    return {"open": open_, "high": high, "low": low, "close": close, "volume": volume}
+
+
+def synthetic_market(n_bars=20_000, seed=0, window=10):
+    # In-memory synthetic history for envs created without `data`
+    return MarketData("<synthetic>", window=window, columns=synthetic_ohlcv(n_bars, seed))
+
+
+if __name__ == "__main__":
+    # python3 ddx_market_data.py <dir> [--synthetic N]   (writes N synthetic bars, then times a reopen)
+    directory = sys.argv[1] if len(sys.argv) > 1 else "market_data"
+    if "--synthetic" in sys.argv:
+        idx = sys.argv.index("--synthetic") + 1
+        write_columns(directory, **synthetic_ohlcv(int(sys.argv[idx])))
+    start = time.perf_counter()
+    data = MarketData(directory)
+    print(f"[DDx Data] Mapped {data.n_bars:,} bars x {len(data.columns)} columns from {directory} "
+          f"in {(time.perf_counter() - start) * 1000:.2f} ms")
@@ -0,0 +1,260 @@
+import os
+import sys
+import time
+import numpy as np
+
+# Event kinds in a depth recording
+DELTA, SNAPSHOT, TRADE = 0, 1, 2
+# Book sides; for TRADE events the side is the resting side that was hit
+BID, ASK = 0, 1
+EVENT_COLUMNS = ("ts", "kind", "side", "price", "size")
+
+
+class BookSide:
+    """One side of the book as sorted price levels in preallocated arrays.
+
+    Levels are kept best-first (bids descending, asks ascending) by sorting on
+    `sign * price`. Only the best `depth` levels are tracked; updates beyond
+    them are dropped. Inserts and removals shift the tail in place.
+    """
+
+    def __init__(self, depth, descending):
+        self.depth = depth
+        self.sign = -1. if descending else 1.
+        self.keys = np.empty(depth)
+        self.sizes = np.empty(depth)
+        self.n = 0
+
+    @property
+    def prices(self):
+        return self.sign * self.keys[:self.n]
+
+    def clear(self):
+        self.n = 0
+
+    def best(self):
+        return self.sign * self.keys[0] if self.n else np.nan
+
+    def size_at(self, price):
+        key = self.sign * price
+        i = int(np.searchsorted(self.keys[:self.n], key))
+        return float(self.sizes[i]) if i < self.n and self.keys[i] == key else 0.
+
+    def update(self, price, size):
+        # size <= 0 removes the level
+        keys, sizes, n = self.keys, self.sizes, self.n
+        key = self.sign * price
+        i = int(np.searchsorted(keys[:n], key))
+        if i < n and keys[i] == key:
+            if size > 0:
+                sizes[i] = size
+            else:
+                keys[i:n - 1] = keys[i + 1:n]
+                sizes[i:n - 1] = sizes[i + 1:n]
+                self.n = n - 1
+        elif size > 0:
+            if n == self.depth:
+                if i == n:
+                    return
+                n -= 1  # drop the worst level to make room
+            keys[i + 1:n + 1] = keys[i:n]
+            sizes[i + 1:n + 1] = sizes[i:n]
+            keys[i] = key
+            sizes[i] = size
+            self.n = n + 1
+
+    def sweep(self, qty):
+        """Walks the levels for a market order of `qty`; returns (filled_qty, average_price).
+
+        The book itself is not changed: replayed deltas already include the market's reaction.
+        """
+        if self.n == 0 or qty <= 0:
+            return 0., np.nan
+        sizes = self.sizes[:self.n]
+        cum = np.cumsum(sizes)
+        k = int(np.searchsorted(cum, qty))
+        if k >= self.n:
+            return float(cum[-1]), float(np.dot(sizes, self.prices) / cum[-1])
+        take = sizes[:k + 1].copy()
+        take[k] = qty - (cum[k - 1] if k else 0.)
+        return float(qty), float(np.dot(take, self.prices[:k + 1]) / qty)
+
+
+class OrderBook:
+    def __init__(self, depth=50):
+        self.depth = depth
+        self.bids = BookSide(depth, descending=True)
+        self.asks = BookSide(depth, descending=False)
+        self.sides = (self.bids, self.asks)
+
+    def clear(self):
+        self.bids.clear()
+        self.asks.clear()
+
+    def apply(self, side, price, size):
+        self.sides[side].update(price, size)
+
+    def mid(self):
+        return 0.5 * (self.bids.best() + self.asks.best())
+
+    def market_order(self, qty):
+        # qty > 0 buys from the asks, qty < 0 sells into the bids
+        if qty > 0:
+            return self.asks.sweep(qty)
+        filled, price = self.bids.sweep(-qty)
+        return -filled, price
+
+    def features(self, levels, out=None):
+        """Top `levels` per side as [bid_px/mid - 1, bid_size, ask_px/mid - 1, ask_size] per level.
+
+        Missing levels are zero. Written into `out` (float32, 4 * levels) when given.
+        """
+        if out is None:
+            out = np.empty(4 * levels, dtype=np.float32)
+        out[:] = 0.
+        grid = out.reshape(levels, 4)
+        mid = self.mid()
+        for col, side in ((0, self.bids), (2, self.asks)):
+            n = min(levels, side.n)
+            grid[:n, col] = side.prices[:n] / mid - 1.
+            grid[:n, col + 1] = side.sizes[:n]
+        return out
+
+
+class RestingOrder:
+    """A passive limit order that tracks its place in the queue at its price level.
+
+    It joins behind everything resting at that price when posted. Trades at the
+    price consume the queue ahead first; only the volume left after that
+    fills the order. A trade through the price fills it outright. Cancels
+    are assumed to come from behind us, except that the queue ahead can never
+    exceed what is left at the level.
+    """
+
+    def __init__(self, book, side, price, qty):
+        self.side = side
+        self.price = price
+        self.qty = qty
+        self.queue_ahead = book.sides[side].size_at(price)
+
+    def on_update(self, book, trades):
+        """Returns the quantity filled by this timestamp's `trades` (list of (side, price, size))."""
+        filled = 0.
+        for side, price, size in trades:
+            if side != self.side or self.qty <= 0:
+                continue
+            through = price < self.price if side == BID else price > self.price
+            if through:
+                filled += self.qty
+                self.qty = 0.
+            elif price == self.price:
+                left = size - self.queue_ahead
+                self.queue_ahead = max(self.queue_ahead - size, 0.)
+                if left > 0:
+                    fill = min(left, self.qty)
+                    filled += fill
+                    self.qty -= fill
+        self.queue_ahead = min(self.queue_ahead, book.sides[self.side].size_at(self.price))
+        return filled
+
+
+def load_events(directory):
+    # Memory-mapped event columns; nothing is read until replay touches it
+    events = {name: np.load(os.path.join(directory, f"{name}.npy"), mmap_mode="r") for name in EVENT_COLUMNS}
+    lengths = {len(col) for col in events.values()}
+    if len(lengths) != 1:
+        raise ValueError(f"depth recording at {directory!r} has columns of different lengths: {sorted(lengths)}")
+    return events
+
+
+def write_events(directory, ts, kind, side, price, size):
+    os.makedirs(directory, exist_ok=True)
+    columns = {"ts": np.asarray(ts, dtype=np.int64), "kind": np.asarray(kind, dtype=np.int8),
+               "side": np.asarray(side, dtype=np.int8), "price": np.asarray(price, dtype=np.float64),
+               "size": np.asarray(size, dtype=np.float64)}
+    for name, values in columns.items():
+        tmp = os.path.join(directory, f".{name}.npy.tmp")
+        with open(tmp, "wb") as f:
+            np.save(f, values)
+        os.replace(tmp, os.path.join(directory, f"{name}.npy"))
+
+
+def replay(directory, depth=50, chunk=1 << 16):
+    """Streams a depth recording, yielding (ts, book, trades) once per timestamp.
+
+    Events are read `chunk` at a time from the memory-mapped columns, so only
+    one chunk of a day's recording is resident. A run of SNAPSHOT events
+    replaces the book; DELTA events set a level's size (0 removes it); TRADE
+    events are passed through in `trades` as (side, price, size). The same
+    OrderBook object is yielded every time and mutated in place.
+    """
+    events = load_events(directory)
+    n = len(events["ts"])
+    book = OrderBook(depth)
+    trades = []
+    in_snapshot = False
+    for lo in range(0, n, chunk):
+        hi = min(lo + chunk, n)
+        ts, kind, side, price, size = (np.asarray(events[name][lo:hi]).tolist() for name in EVENT_COLUMNS)
+        next_ts = int(events["ts"][hi]) if hi < n else None
+        for i in range(hi - lo):
+            k = kind[i]
+            if k == SNAPSHOT:
+                if not in_snapshot:
+                    book.clear()
+                    in_snapshot = True
+                book.apply(side[i], price[i], size[i])
+            else:
+                in_snapshot = False
+                if k == DELTA:
+                    book.apply(side[i], price[i], size[i])
+                else:
+                    trades.append((side[i], price[i], size[i]))
+            following = ts[i + 1] if i + 1 < hi - lo else next_ts
+            if following != ts[i]:
+                yield ts[i], book, trades
+                trades = []
+                in_snapshot = False
+
+
+def synthetic_events(n_steps, levels=20, tick=0.01, seed=0, start_price=100.):
+    # Random-walk book: one snapshot, then per step a few level deltas and an occasional trade
+    rng = np.random.default_rng(seed)
+    rows = []
+    mid = int(round(start_price / tick))
+    for j in range(1, levels + 1):
+        rows.append((0, SNAPSHOT, BID, (mid - j) * tick, float(rng.integers(1, 50))))
+        rows.append((0, SNAPSHOT, ASK, (mid + j) * tick, float(rng.integers(1, 50))))
+    for step in range(1, n_steps):
+        move = int(rng.integers(-1, 2))
+        if move:
+            # Shift the inside: the level crossed by the move empties and a new one appears on the far side
+            gone, new = (ASK, BID) if move > 0 else (BID, ASK)
+            rows.append((step, DELTA, gone, (mid + move) * tick, 0.))
+            mid += move
+            rows.append((step, DELTA, new, (mid - move) * tick, float(rng.integers(1, 50))))
+        for _ in range(3):
+            side = int(rng.integers(0, 2))
+            offset = int(rng.integers(1, levels))
+            px = (mid - offset) * tick if side == BID else (mid + offset) * tick
+            rows.append((step, DELTA, side, px, float(rng.integers(0, 50))))
+        if rng.random() < 0.3:
+            side = int(rng.integers(0, 2))
+            px = (mid - 1) * tick if side == BID else (mid + 1) * tick
+            rows.append((step, TRADE, side, px, float(rng.integers(1, 20))))
+    ts, kind, side, price, size = zip(*rows)
+    return ts, kind, side, np.round(np.array(price), 8), size
+
+
+if __name__ == "__main__":
+    # python3 ddx_orderbook.py <dir> [--synthetic N]   (writes N synthetic steps, then times a full replay)
+    directory = sys.argv[1] if len(sys.argv) > 1 else "depth_data"
+    if "--synthetic" in sys.argv:
+        idx = sys.argv.index("--synthetic") + 1
+        write_events(directory, *synthetic_events(int(sys.argv[idx])))
+    n_events = len(load_events(directory)["ts"])
+    start = time.perf_counter()
+    updates = sum(1 for _ in replay(directory))
+    elapsed = time.perf_counter() - start
+    print(f"[DDx OrderBook] Replayed {n_events:,} events ({updates:,} book updates) in {elapsed:.2f}s "
+          f"({n_events / elapsed:,.0f} events/sec)")
@@ -0,0 +1,139 @@
+import os
+import gymnasium as gym
+import numpy as np
+
+from ddx_market_data import MarketData, synthetic_market
+from ddx_features import open_feature_store
+from ddx_execution import ExecutionModel
+from ddx_rng import BlockRNG, make_generator
+from ddx_trading_env import ACTIONS
+
+
+def open_universe(assets):
+    # A directory of per-asset market data directories, or a list of MarketData / paths
+    if isinstance(assets, str):
+        names = sorted(n for n in os.listdir(assets) if os.path.isdir(os.path.join(assets, n)))
+        if not names:
+            raise ValueError(f"no asset directories under {assets!r}")
+        return names, [MarketData(os.path.join(assets, n)) for n in names]
+    markets = [MarketData(a) if isinstance(a, str) else a for a in assets]
+    return [os.path.basename(str(m.path).rstrip("/")) for m in markets], markets
+
+
+class PortfolioTradingEnv(gym.Env):
+    """K assets traded together from one shared cash balance.
+
+    Observations are a [K, F] array (F = the close window, or the feature
+    store row when `features` is given). Actions are either MultiDiscrete([3] * K)
+    short/flat/long per asset (`action_mode="discrete"`, each asset sized to
+    capital / K at its first price) or target portfolio weights in [-1, 1]
+    (`action_mode="weights"`, scaled down so gross exposure stays <= equity).
+    Each asset's history is memory-mapped like TradingEnv's, so every worker
+    shares the same pages and memory grows with the number of assets, not workers.
+    """
+
+    def __init__(self, assets=None, features=None, n_assets=4, max_steps=200, action_mode="discrete",
+                 execution=None, seed=None):
+        super().__init__()
+        self._seed(seed)
+        if action_mode not in ("discrete", "weights"):
+            raise ValueError(f"action_mode must be 'discrete' or 'weights', got {action_mode!r}")
+        if assets is None:
+            seed = int(self.np_random.integers(2 ** 31))
+            self.names = [f"synthetic_{k}" for k in range(n_assets)]
+            self.markets = [synthetic_market(seed=seed + k) for k in range(n_assets)]
+        else:
+            self.names, self.markets = open_universe(assets)
+        lengths = {m.n_bars for m in self.markets}
+        if len(lengths) != 1:
+            raise ValueError(f"assets must share one bar clock, got histories of lengths {sorted(lengths)}")
+        if features is not None:
+            if len(features) != len(self.markets):
+                raise ValueError(f"got {len(features)} feature stores for {len(self.markets)} assets")
+            features = [open_feature_store(f, m) for f, m in zip(features, self.markets)]
+        self.features = features
+        self.n_assets = len(self.markets)
+        self.max_steps = max_steps
+        self.action_mode = action_mode
+        # One execution lane per asset; the lanes start with no cash of their own and
+        # the account's cash is capital plus the sum of their cash flows
+        self.execution = execution or ExecutionModel(n_envs=self.n_assets, capital=0.)
+        self.capital = 10_000.
+        first = np.array([float(m["close"][m.window - 1]) for m in self.markets])
+        self.order_size = self.capital / self.n_assets / first
+        self.closes = [m["close"] for m in self.markets]
+        self.volumes = [m.columns.get("volume") for m in self.markets]
+        n_features = features[0].n_features if features is not None else self.markets[0].window
+        # Alternating observation buffers, as in TradingEnv
+        self._obs, self._next_obs = np.zeros((2, self.n_assets, n_features), dtype=np.float32)
+        self._prices = np.empty(self.n_assets)
+        self._volume = np.empty(self.n_assets)
+        self.observation_space = gym.spaces.Box(-np.inf, np.inf, shape=self._obs.shape, dtype=np.float32)
+        if action_mode == "discrete":
+            self.action_space = gym.spaces.MultiDiscrete([len(ACTIONS)] * self.n_assets)  # per asset 0: sell, 1: hold, 2: buy
+        else:
+            self.action_space = gym.spaces.Box(-1., 1., shape=(self.n_assets,), dtype=np.float32)
+
+    @property
+    def cash(self):
+        return self.capital + float(self.execution.cash.sum())
+
+    @property
+    def equity(self):
+        return self.capital + float(self.execution.equity.sum())
+
+    def _seed(self, seed):
+        # seed: int or SeedSequence, as for TradingEnv
+        self.np_random = make_generator(seed)
+        self.rng = BlockRNG(self.np_random)
+
+    def reset(self, seed=None, options=None):
+        if seed is not None:
+            self._seed(seed)
+        self.step_count = 0
+        self.profit = 0.
+        self.execution.reset()
+        min_t = self.features[0].lookback if self.features is not None else 0
+        self.t = self.markets[0].sample_start(self.rng, self.max_steps, min_t)
+        return self._get_obs().copy(), {}
+
+    def step(self, action):
+        """Trades every asset towards `action` and returns (obs, reward, terminated, truncated, info).
+
+        As in TradingEnv.step, `obs` is one of two alternating [K, F] buffers and
+        is overwritten two steps later; the final step of an episode returns a copy.
+        """
+        sim = self.execution
+        prices = self._gather(self.closes, self._prices)
+        if self.action_mode == "discrete":
+            target = (np.asarray(action) - 1) * self.order_size
+        else:
+            weights = np.clip(np.asarray(action, dtype=np.float64), -1., 1.)
+            gross = np.abs(weights).sum()
+            if gross > 1.:
+                weights /= gross
+            target = weights * self.equity / prices
+        volume = self._gather(self.volumes, self._volume) if self.volumes[0] is not None else None
+        cost = sim.execute(target, prices, volume)
+        self.t += 1
+        reward = float(sim.mark(self._gather(self.closes, self._prices)).sum()) / self.capital
+        self.profit += reward
+        self.step_count += 1
+        truncated = self.step_count >= self.max_steps
+        info = {"positions": sim.position.copy(), "cash": self.cash, "equity": self.equity, "cost": float(cost.sum())}
+        obs = self._get_obs()
+        return (obs.copy() if truncated else obs), reward, False, truncated, info
+
+    def _gather(self, columns, out):
+        for k, col in enumerate(columns):
+            out[k] = col[self.t]
+        return out
+
+    def _get_obs(self):
+        self._obs, self._next_obs = self._next_obs, self._obs
+        for k, market in enumerate(self.markets):
+            if self.features is not None:
+                self._obs[k] = self.features[k].row(self.t)
+            else:
+                self._obs[k] = market.window_view("close", self.t)
+        return self._obs
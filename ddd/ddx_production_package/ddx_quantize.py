@@ -0,0 +1,137 @@
+import os
+import sys
+import time
+
+import numpy as np
+import onnx
+import onnxruntime as ort
+from onnxruntime.quantization import CalibrationDataReader, QuantFormat, QuantType, quantize_dynamic, quantize_static
+from onnxruntime.quantization.shape_inference import quant_pre_process
+
+from ddx_export import run_session
+
+MODES = ("dynamic", "static")
+MIN_AGREEMENT = 0.99
+CALIBRATION_SAMPLES = 1024
+# Float (Box) actions count as agreeing when every component is within this distance
+ACTION_ATOL = 1e-2
+
+
+def quantized_path(path):
+    # ddx_model.onnx / ddx_model.ort -> ddx_model.int8.onnx (the bridge's --model-variant int8)
+    return os.path.splitext(path)[0] + ".int8.onnx"
+
+
+class ObservationReader(CalibrationDataReader):
+    """Feeds calibration observations to quantize_static one row at a time."""
+
+    def __init__(self, obs):
+        self.obs = obs
+        self.pos = 0
+
+    def get_next(self):
+        if self.pos == len(self.obs):
+            return None
+        self.pos += 1
+        return {"obs": self.obs[self.pos - 1:self.pos]}
+
+
+def action_agreement(float_path, quant_path, obs):
+    # Fraction of observations on which both models pick the same action (every asset's, for portfolios)
+    want = run_session(ort.InferenceSession(float_path, providers=["CPUExecutionProvider"]), obs)[0]
+    got = run_session(ort.InferenceSession(quant_path, providers=["CPUExecutionProvider"]), obs)[0]
+    if np.issubdtype(want.dtype, np.integer):
+        same = want == got
+    else:
+        same = np.isclose(want, got, rtol=0., atol=ACTION_ATOL)
+    return float(np.mean(np.all(same.reshape(len(obs), -1), axis=1)))
+
+
+def latency(path, obs, runs=200):
+    # Median single-observation session.run time in seconds
+    sess = ort.InferenceSession(path, providers=["CPUExecutionProvider"])
+    row = obs[:1]
+    sess.run(None, {"obs": row})
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        sess.run(None, {"obs": row})
+        times.append(time.perf_counter() - start)
+    return float(np.median(times))
+
+
+def quantize(path, mode, calibration, evaluation, min_agreement=MIN_AGREEMENT, out_path=None):
+    """Writes an INT8 copy of the ONNX model at `path` and keeps it only if it trades like the float one.
+
+    "dynamic" quantizes the weights and computes activation scales at run
+    time; "static" also fixes the activation scales from `calibration`
+    observations (TradingEnv rollouts or recorded live requests). The copy is
+    deleted, and None returned, if its actions agree with the float model's on
+    fewer than `min_agreement` of the `evaluation` observations.
+    """
+    if mode not in MODES:
+        raise ValueError(f"quantization mode must be one of {MODES}, got {mode!r}")
+    out_path = out_path or quantized_path(path)
+    prepared = out_path + ".pre.onnx"
+    quant_pre_process(path, prepared)
+    try:
+        if mode == "dynamic":
+            quantize_dynamic(prepared, out_path, weight_type=QuantType.QInt8)
+        else:
+            quantize_static(prepared, out_path, ObservationReader(calibration), quant_format=QuantFormat.QDQ,
+                            activation_type=QuantType.QUInt8, weight_type=QuantType.QInt8)
+    finally:
+        os.remove(prepared)
+    agreement = action_agreement(path, out_path, evaluation)
+    model = onnx.load(out_path)
+    props = {p.key: p.value for p in model.metadata_props}
+    props.update({"quantization": f"int8-{mode}", "action_agreement": f"{agreement:.6f}"})
+    onnx.helper.set_model_props(model, props)
+    onnx.save(model, out_path)
+    print(f"[DDx Quantize] int8-{mode}: {os.path.getsize(out_path):,} bytes vs {os.path.getsize(path):,}, "
+          f"{latency(out_path, evaluation) * 1e6:.1f}us vs {latency(path, evaluation) * 1e6:.1f}us per row, "
+          f"action agreement {agreement:.2%} on {len(evaluation)} observations")
+    if agreement < min_agreement:
+        os.remove(out_path)
+        print(f"[DDx Quantize] Rejected: agreement below {min_agreement:.2%}, keeping only the float model")
+        return None
+    print(f"[DDx Quantize] Saved {out_path}")
+    return out_path
+
+
+def load_observations(path, row_shape):
+    # Recorded observations as an .npy array of rows; at least one row of the model's shape
+    obs = np.load(path).astype(np.float32)
+    if obs.size == 0 or obs.size % int(np.prod(row_shape)):
+        raise ValueError(f"{path}: shape {list(obs.shape)} is not a batch of {list(row_shape)} observations")
+    return obs.reshape((-1,) + tuple(row_shape))
+
+
+def split_observations(obs, seed=0):
+    # Disjoint (calibration, evaluation) halves, so agreement isn't measured on the rows the scales came from
+    order = np.random.default_rng(seed).permutation(len(obs))
+    half = len(obs) // 2
+    return obs[np.sort(order[:half][:CALIBRATION_SAMPLES])], obs[np.sort(order[half:])]
+
+
+if __name__ == "__main__":
+    # Quantizes an exported model from recorded observations, e.g.
+    #   python3 ddx_quantize.py ddx_model.onnx live_obs.npy --mode static
+    if len(sys.argv) < 3:
+        raise SystemExit("usage: python3 ddx_quantize.py <model.onnx> <observations.npy> "
+                         "[--mode dynamic|static] [--min-agreement 0.99]")
+    mode = "dynamic"
+    min_agreement = MIN_AGREEMENT
+    if "--mode" in sys.argv:
+        idx = sys.argv.index("--mode") + 1
+        mode = sys.argv[idx]
+    if "--min-agreement" in sys.argv:
+        idx = sys.argv.index("--min-agreement") + 1
+        min_agreement = float(sys.argv[idx])
+    row_shape = ort.InferenceSession(sys.argv[1]).get_inputs()[0].shape[1:]
+    obs = load_observations(sys.argv[2], row_shape)
+    if len(obs) < 2:
+        raise SystemExit(f"{sys.argv[2]}: need at least 2 observations")
+    calibration, evaluation = split_observations(obs)
+    if quantize(sys.argv[1], mode, calibration, evaluation, min_agreement) is None:
+        sys.exit(1)
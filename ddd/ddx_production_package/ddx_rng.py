@@ -0,0 +1,40 @@
+import numpy as np
+
+BLOCK = 4096
+
+
+def spawn_seeds(seed, n):
+    """n independent child SeedSequences of `seed` (an int, None for fresh entropy, or a SeedSequence)."""
+    root = seed if isinstance(seed, np.random.SeedSequence) else np.random.SeedSequence(seed)
+    return root.spawn(n)
+
+
+def make_generator(seed):
+    # Accepts an int, None or a SeedSequence (e.g. one from spawn_seeds)
+    return np.random.default_rng(seed)
+
+
+class BlockRNG:
+    """Hands out uniforms from a Generator drawn BLOCK values at a time.
+
+    Envs call it once per episode or step; refilling a buffer every BLOCK draws
+    costs far less than a Generator call each time. The sequence depends only
+    on the Generator's seed, so a recorded seed replays the same draws.
+    """
+
+    def __init__(self, generator, block=BLOCK):
+        self.generator = generator
+        self.buffer = np.empty(block)
+        self.pos = block
+
+    def random(self):
+        if self.pos == len(self.buffer):
+            self.generator.random(out=self.buffer)
+            self.pos = 0
+        value = self.buffer[self.pos]
+        self.pos += 1
+        return value
+
+    def integers(self, low, high):
+        # Uniform int in [low, high), same contract as Generator.integers for scalars
+        return low + int(self.random() * (high - low))
@@ -0,0 +1,239 @@
+import os
+import sys
+import time
+import multiprocessing as mp
+from multiprocessing import shared_memory
+
+import numpy as np
+from stable_baselines3.common.vec_env import VecEnv
+from stable_baselines3.common.vec_env.base_vec_env import CloudpickleWrapper
+
+BUFFERS = ("obs", "actions", "rewards", "dones")
+
+
+def _buffer_specs(n_envs, observation_space, action_space):
+    return {
+        "obs": ((n_envs,) + observation_space.shape, np.dtype(np.float32)),
+        "actions": ((n_envs,) + action_space.shape, np.dtype(action_space.dtype)),
+        "rewards": ((n_envs,), np.dtype(np.float32)),
+        "dones": ((n_envs,), np.dtype(bool)),
+    }
+
+
+def _attach(names, specs):
+    blocks, arrays = [], {}
+    for key in BUFFERS:
+        # Workers share the parent's resource tracker, which forgets the segment when the parent unlinks it
+        shm = shared_memory.SharedMemory(name=names[key])
+        shape, dtype = specs[key]
+        blocks.append(shm)
+        arrays[key] = np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+    return blocks, arrays
+
+
+def _worker(remote, parent_remote, env_fns_wrapper, indices):
+    parent_remote.close()
+    envs = [fn() for fn in env_fns_wrapper.var]
+    blocks, buf = [], None
+    try:
+        while True:
+            cmd, data = remote.recv()
+            if cmd == "step":
+                # Observations, rewards and dones go straight into shared memory;
+                # only the infos of finished episodes travel over the pipe
+                finished = {}
+                for i, env in zip(indices, envs):
+                    obs, reward, terminated, truncated, info = env.step(buf["actions"][i])
+                    done = terminated or truncated
+                    if done:
+                        info["terminal_observation"] = obs
+                        info["TimeLimit.truncated"] = truncated and not terminated
+                        obs, reset_info = env.reset()
+                        finished[i] = (info, reset_info)
+                    buf["obs"][i] = obs
+                    buf["rewards"][i] = reward
+                    buf["dones"][i] = done
+                remote.send(finished)
+            elif cmd == "reset":
+                seeds, options = data
+                reset_infos = {}
+                for i, env in zip(indices, envs):
+                    obs, reset_infos[i] = env.reset(seed=seeds[i], options=options[i])
+                    buf["obs"][i] = obs
+                remote.send(reset_infos)
+            elif cmd == "get_spaces":
+                remote.send((envs[0].observation_space, envs[0].action_space))
+            elif cmd == "attach":
+                blocks, buf = _attach(*data)
+                remote.send(None)
+            elif cmd == "get_attr":
+                remote.send({i: getattr(env, data) for i, env in zip(indices, envs)})
+            elif cmd == "set_attr":
+                name, value, targets = data
+                for i, env in zip(indices, envs):
+                    if i in targets:
+                        setattr(env, name, value)
+                remote.send({})
+            elif cmd == "env_method":
+                name, args, kwargs = data
+                remote.send({i: getattr(env, name)(*args, **kwargs) for i, env in zip(indices, envs)})
+            elif cmd == "is_wrapped":
+                from stable_baselines3.common.env_util import is_wrapped
+                remote.send({i: is_wrapped(env, data) for i, env in zip(indices, envs)})
+            elif cmd == "close":
+                break
+            else:
+                raise NotImplementedError(f"unknown command {cmd!r}")
+    except (KeyboardInterrupt, EOFError):
+        pass
+    finally:
+        for env in envs:
+            env.close()
+        buf = None
+        for shm in blocks:
+            shm.close()
+        remote.close()
+
+
+class ShmVecEnv(VecEnv):
+    """Subprocess VecEnv that exchanges step data through shared memory.
+
+    Envs are split across `n_workers` processes (default: one per core, at
+    most one per env). Observations, actions, rewards and dones live in
+    `multiprocessing.shared_memory` arrays that the workers read and write in
+    place. Each step sends only a one-word command per worker down its pipe,
+    plus the infos of episodes that just finished on the way back, so nothing
+    is pickled per step. Per-step infos of unfinished episodes are not forwarded.
+    """
+
+    def __init__(self, env_fns, n_workers=None, start_method=None):
+        self.waiting = False
+        self.closed = False
+        n_envs = len(env_fns)
+        n_workers = min(n_workers or os.cpu_count() or 1, n_envs)
+        if start_method is None:
+            start_method = "forkserver" if "forkserver" in mp.get_all_start_methods() else "spawn"
+        ctx = mp.get_context(start_method)
+        self.worker_indices = [list(map(int, chunk)) for chunk in np.array_split(np.arange(n_envs), n_workers)]
+        self.remotes, work_remotes = zip(*[ctx.Pipe() for _ in range(n_workers)])
+        self.processes = []
+        for work_remote, remote, indices in zip(work_remotes, self.remotes, self.worker_indices):
+            fns = CloudpickleWrapper([env_fns[i] for i in indices])
+            process = ctx.Process(target=_worker, args=(work_remote, remote, fns, indices), daemon=True)
+            process.start()
+            self.processes.append(process)
+            work_remote.close()
+
+        self.remotes[0].send(("get_spaces", None))
+        observation_space, action_space = self.remotes[0].recv()
+        super().__init__(n_envs, observation_space, action_space)
+
+        specs = _buffer_specs(n_envs, observation_space, action_space)
+        self._blocks, self.buffers, names = [], {}, {}
+        for key in BUFFERS:
+            shape, dtype = specs[key]
+            shm = shared_memory.SharedMemory(create=True, size=max(1, int(np.prod(shape)) * dtype.itemsize))
+            self._blocks.append(shm)
+            self.buffers[key] = np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+            names[key] = shm.name
+        for remote in self.remotes:
+            remote.send(("attach", (names, specs)))
+        for remote in self.remotes:
+            remote.recv()
+
+    def _indices(self, indices):
+        if indices is None:
+            return range(self.num_envs)
+        if isinstance(indices, int):
+            return [indices]
+        return indices
+
+    def _gather(self, cmd, data, indices):
+        for remote in self.remotes:
+            remote.send((cmd, data))
+        merged = {}
+        for remote in self.remotes:
+            merged.update(remote.recv())
+        return [merged[i] for i in self._indices(indices)]
+
+    def reset(self):
+        for remote in self.remotes:
+            remote.send(("reset", (self._seeds, self._options)))
+        merged = {}
+        for remote in self.remotes:
+            merged.update(remote.recv())
+        self.reset_infos = [merged[i] for i in range(self.num_envs)]
+        self._reset_seeds()
+        self._reset_options()
+        return self.buffers["obs"].copy()
+
+    def step_async(self, actions):
+        self.buffers["actions"][:] = np.asarray(actions).reshape(self.buffers["actions"].shape)
+        for remote in self.remotes:
+            remote.send(("step", None))
+        self.waiting = True
+
+    def step_wait(self):
+        infos = [{} for _ in range(self.num_envs)]
+        for remote in self.remotes:
+            for i, (info, reset_info) in remote.recv().items():
+                infos[i] = info
+                self.reset_infos[i] = reset_info
+        self.waiting = False
+        buf = self.buffers
+        return buf["obs"].copy(), buf["rewards"].copy(), buf["dones"].copy(), infos
+
+    def close(self):
+        if self.closed:
+            return
+        if self.waiting:
+            for remote in self.remotes:
+                remote.recv()
+        for remote in self.remotes:
+            remote.send(("close", None))
+        for process in self.processes:
+            process.join()
+        self.buffers = {}
+        for shm in self._blocks:
+            shm.close()
+            shm.unlink()
+        self.closed = True
+
+    def get_attr(self, attr_name, indices=None):
+        return self._gather("get_attr", attr_name, indices)
+
+    def set_attr(self, attr_name, value, indices=None):
+        self._gather("set_attr", (attr_name, value, list(self._indices(indices))), [])
+
+    def env_method(self, method_name, *method_args, indices=None, **method_kwargs):
+        return self._gather("env_method", (method_name, method_args, method_kwargs), indices)
+
+    def env_is_wrapped(self, wrapper_class, indices=None):
+        return self._gather("is_wrapped", wrapper_class, indices)
+
+
+def benchmark(n_envs=16, steps=2000):
+    from stable_baselines3.common.vec_env import SubprocVecEnv
+    from ddx_trading_env import TradingEnv
+
+    results = {}
+    for name, cls in (("subproc", SubprocVecEnv), ("shm", ShmVecEnv)):
+        env = cls([lambda: TradingEnv() for _ in range(n_envs)])
+        env.reset()
+        actions = np.random.randint(0, 3, size=(steps, n_envs))
+        start = time.perf_counter()
+        for t in range(steps):
+            env.step(actions[t])
+        results[name] = n_envs * steps / (time.perf_counter() - start)
+        env.close()
+        print(f"[DDx ShmVecEnv] {name:7s} n_envs={n_envs}: {results[name]:,.0f} steps/sec")
+    print(f"[DDx ShmVecEnv] speedup: {results['shm'] / results['subproc']:.1f}x")
+    return results
+
+
+if __name__ == "__main__":
+    n_envs = 16
+    if "--n-envs" in sys.argv:
+        idx = sys.argv.index("--n-envs") + 1
+        n_envs = int(sys.argv[idx])
+    benchmark(n_envs=n_envs)
@@ -1,25 +1,159 @@
-import gym
+import gymnasium as gym
 import numpy as np
 
+from ddx_market_data import MarketData, synthetic_market
+from ddx_features import open_feature_store
+from ddx_execution import ExecutionModel
+from ddx_orderbook import BID, ASK, RestingOrder, replay
+from ddx_rng import BlockRNG, make_generator
+
+# Discrete action i trades to position i - 1 (short, flat, long); also stamped into exported models
+ACTIONS = ("sell", "hold", "buy")
+
+
 class TradingEnv(gym.Env):
-    def __init__(self):
+    def __init__(self, data=None, features=None, max_steps=200, execution=None, order_size=None,
+                 book=None, book_levels=5, order_type="market", seed=None, start_bar=0):
         super().__init__()
-        self.observation_space = gym.spaces.Box(-np.inf, np.inf, shape=(10,))
-        self.action_space = gym.spaces.Discrete(3) # 0: sell, 1: hold, 2: buy
-        self.reset()
+        # data: MarketData (or a path to one) to replay history; None generates a synthetic random walk
+        # features: FeatureStore (or its directory) whose rows become the observations
+        # execution: ExecutionModel with the fee/spread/slippage settings (defaults otherwise)
+        # order_size: base units per position step; defaults to one account's capital at the first price
+        # book: directory of recorded L2 depth (see ddx_orderbook.py); replaces `data` with an
+        #   order book replay where orders fill against the book ("market") or queue at the touch ("limit")
+        # seed: int or SeedSequence (one per env, see ddx_rng.spawn_seeds) for this env's own
+        #   Generator (episode starts, synthetic history); reset(seed=...) reseeds it
+        # start_bar: earliest bar an episode may start at (warm-start fine-tuning on recent bars only)
+        self._seed(seed)
+        if order_type not in ("market", "limit"):
+            raise ValueError(f"order_type must be 'market' or 'limit', got {order_type!r}")
+        self.max_steps = max_steps
+        self.start_bar = start_bar
+        self.book_path = book
+        if book is not None:
+            # Spread and depth come from the book itself
+            self.execution = execution or ExecutionModel(n_envs=1, half_spread_bps=0.)
+            self.book_levels = book_levels
+            self.order_type = order_type
+            self._start_replay()
+            self.order_size = order_size or self.execution.capital / self.book.mid()
+            obs_dim = 4 * book_levels
+        else:
+            if isinstance(data, str):
+                data = MarketData(data)
+            if data is None:
+                data = synthetic_market(seed=int(self.np_random.integers(2 ** 31)))
+            self.data = data
+            self.features = open_feature_store(features, data) if features is not None else None
+            self.execution = execution or ExecutionModel(n_envs=1)
+            self.order_size = order_size or self.execution.capital / float(data["close"][data.window - 1])
+            self.volume = data.columns.get("volume")
+            obs_dim = self.features.n_features if self.features is not None else data.window
+        # Observations alternate between two buffers and are returned without a per-step allocation,
+        # so each one stays valid until the step after the one that returned it
+        self._obs, self._next_obs = np.zeros((2, obs_dim), dtype=np.float32)
+        self.observation_space = gym.spaces.Box(-np.inf, np.inf, shape=(obs_dim,), dtype=np.float32)
+        self.action_space = gym.spaces.Discrete(len(ACTIONS)) # 0: sell, 1: hold, 2: buy
+
+    def _seed(self, seed):
+        self.np_random = make_generator(seed)
+        self.rng = BlockRNG(self.np_random)
 
-    def reset(self):
+    def reset(self, seed=None, options=None):
+        if seed is not None:
+            self._seed(seed)
         self.step_count = 0
         self.profit = 0.
-        return self._get_obs()
+        self.execution.reset()
+        if self.book_path is not None:
+            # Episodes run back to back through the recording; a seeded reset rewinds it so the
+            # same seed and actions replay the same episode
+            if seed is not None:
+                self._start_replay()
+            self.resting = None
+        else:
+            # Each episode replays a random slice of history
+            min_t = max(self.features.lookback if self.features is not None else 0, self.start_bar)
+            self.t = self.data.sample_start(self.rng, self.max_steps, min_t)
+        # Once per episode, so the reset observation is a copy the first step() can't overwrite
+        return self._get_obs().copy(), {}
 
     def step(self, action):
-        # Dummy logic for example
-        reward = np.random.normal(1.0, 0.1) if action == 2 else np.random.normal(-0.5, 0.1)
+        """Trades to the position `action` selects and returns (obs, reward, terminated, truncated, info).
+
+        `obs` is one of the env's two observation buffers: the next step()
+        returns the other one, and the step after that overwrites it, so copy it
+        to keep it longer. The final step of an episode returns a copy.
+        """
+        sim = self.execution
+        target = (int(action) - 1) * self.order_size
+        if self.book_path is not None:
+            cost = self._book_step(target)
+            price = self.book.mid()
+        else:
+            # Trade to a short/flat/long position at this bar's close, then mark it at the next one
+            close = self.data["close"]
+            volume = self.volume[self.t] if self.volume is not None else None
+            cost = sim.execute(target, close[self.t], volume)
+            self.t += 1
+            price = close[self.t]
+        reward = float(sim.mark(price)[0]) / sim.capital
         self.profit += reward
         self.step_count += 1
-        done = (self.step_count >= 200)
-        return self._get_obs(), reward, done, {}
+        # Episodes end on the step limit only: a time limit, so truncated rather than terminated
+        truncated = self.step_count >= self.max_steps
+        info = {"position": float(sim.position[0]), "equity": float(sim.equity[0]), "cost": float(cost[0])}
+        obs = self._get_obs()
+        # The vec env keeps the final observation across the auto-reset, so hand it its own copy
+        return (obs.copy() if truncated else obs), reward, False, truncated, info
+
+    def _start_replay(self):
+        self._replay = replay(self.book_path)
+        self.ts, self.book, self.trades = next(self._replay)
+
+    def _advance_book(self):
+        try:
+            self.ts, self.book, self.trades = next(self._replay)
+        except StopIteration:
+            self._start_replay()
+
+    def _book_step(self, target):
+        sim = self.execution
+        position = float(sim.position[0])
+        cost = np.zeros(1)
+        if self.order_type == "market":
+            # Sweep the book now, then let the next update arrive
+            filled, price = self.book.market_order(target - position)
+            if filled:
+                cost = sim.execute(position + filled, price)
+            self._advance_book()
+            return cost
+        # Limit: keep one order resting at the touch for whatever is left to reach the target
+        wanted = target - position
+        order = self.resting
+        if order is None or np.sign(wanted) != (1 if order.side == BID else -1) or not wanted:
+            order = None
+            if wanted:
+                side = BID if wanted > 0 else ASK
+                order = RestingOrder(self.book, side, self.book.sides[side].best(), abs(wanted))
+        self._advance_book()
+        if order is not None:
+            filled = order.on_update(self.book, self.trades)
+            if filled:
+                cost = sim.execute(position + (filled if order.side == BID else -filled), order.price)
+            if order.qty <= 0:
+                order = None
+        self.resting = order
+        return cost
 
     def _get_obs(self):
-        return np.random.random(10)
+        self._obs, self._next_obs = self._next_obs, self._obs
+        if self.book_path is not None:
+            return self.book.features(self.book_levels, self._obs)
+        if self.features is not None:
+            # Precomputed row for this bar, straight from the memory-mapped store
+            self._obs[:] = self.features.row(self.t)
+        else:
+            # Window over the memory-mapped close column
+            self._obs[:] = self.data.window_view("close", self.t)
+        return self._obs
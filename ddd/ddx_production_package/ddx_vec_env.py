@@ -0,0 +1,166 @@
+import sys
+import time
+import numpy as np
+from gymnasium import spaces
+from stable_baselines3.common.vec_env import VecEnv
+
+from ddx_market_data import MarketData, synthetic_market
+from ddx_features import open_feature_store
+from ddx_execution import ExecutionModel
+from ddx_rng import BlockRNG, make_generator, spawn_seeds
+from ddx_trading_env import ACTIONS
+
+
+class VecTradingEnv(VecEnv):
+    """N copies of TradingEnv stepped together with array operations.
+
+    Per-env state (step counts, profit, replay cursors) lives in NumPy arrays,
+    so one call to step_wait() advances every env without a Python loop over
+    envs. Finished envs are reset in place, with the last observation passed
+    through infos[i]["terminal_observation"] (same contract as DummyVecEnv).
+    All envs replay the same memory-mapped history (a synthetic one without
+    `data`) from their own random offsets, and fills go through one batched
+    ExecutionModel.
+    """
+
+    def __init__(self, n_envs=64, obs_dim=10, max_steps=200, seed=None, data=None, features=None,
+                 execution=None, order_size=None, start_bar=0):
+        # One child SeedSequence for shared setup, then one independent stream per env
+        seeds = spawn_seeds(seed, n_envs + 1)
+        rng = make_generator(seeds[0])
+        if isinstance(data, str):
+            data = MarketData(data)
+        if data is None:
+            data = synthetic_market(seed=int(rng.integers(2 ** 31)), window=obs_dim)
+        self.data = data
+        self.features = open_feature_store(features, data) if features is not None else None
+        self.min_t = max(self.features.lookback if self.features is not None else 0, start_bar)
+        obs_dim = self.features.n_features if self.features is not None else data.window
+        observation_space = spaces.Box(-np.inf, np.inf, shape=(obs_dim,), dtype=np.float32)
+        action_space = spaces.Discrete(len(ACTIONS))  # 0: sell, 1: hold, 2: buy
+        self.render_mode = None
+        super().__init__(n_envs, observation_space, action_space)
+        self.obs_dim = obs_dim
+        self.max_steps = max_steps
+        self.rng = rng
+        self.rngs = [BlockRNG(make_generator(s)) for s in seeds[1:]]
+        self.execution = execution or ExecutionModel(n_envs=n_envs)
+        self.order_size = order_size or self.execution.capital / float(data["close"][data.window - 1])
+        self.volume = data.columns.get("volume")
+        self.step_count = np.zeros(n_envs, dtype=np.int64)
+        self.profit = np.zeros(n_envs, dtype=np.float64)
+        self.t = np.zeros(n_envs, dtype=np.int64)
+        self._obs = np.empty((n_envs, obs_dim), dtype=np.float32)
+        self._actions = np.zeros(n_envs, dtype=np.int64)
+
+    def reset(self):
+        self.step_count[:] = 0
+        self.profit[:] = 0.
+        self.execution.reset()
+        self.t[:] = [self.data.sample_start(r, self.max_steps, self.min_t) for r in self.rngs]
+        self._get_obs()
+        self.reset_infos = [{} for _ in range(self.num_envs)]
+        return self._obs.copy()
+
+    def step_async(self, actions):
+        self._actions = np.asarray(actions).reshape(self.num_envs)
+
+    def step_wait(self):
+        # Same fill and mark-to-market as TradingEnv.step, for every env at once
+        close = self.data["close"]
+        sim = self.execution
+        volume = self.volume[self.t] if self.volume is not None else None
+        sim.execute((self._actions - 1) * self.order_size, close[self.t], volume)
+        self.t += 1
+        rewards = sim.mark(close[self.t]) / sim.capital
+        self.profit += rewards
+        self.step_count += 1
+        dones = self.step_count >= self.max_steps
+        self._get_obs()
+        infos = [{} for _ in range(self.num_envs)]
+        if dones.any():
+            done_idx = np.flatnonzero(dones)
+            for i in done_idx:
+                # Every episode ends on the step limit, so PPO bootstraps from the terminal value
+                infos[i]["TimeLimit.truncated"] = True
+                infos[i]["terminal_observation"] = self._obs[i].copy()
+                infos[i]["profit"] = float(self.profit[i])
+                infos[i]["equity"] = float(sim.equity[i])
+            self.step_count[done_idx] = 0
+            self.profit[done_idx] = 0.
+            sim.reset(done_idx)
+            self.t[done_idx] = [self.data.sample_start(self.rngs[i], self.max_steps, self.min_t) for i in done_idx]
+            self._obs[done_idx] = self._observe(self.t[done_idx])
+        return self._obs.copy(), rewards.astype(np.float32), dones, infos
+
+    def _get_obs(self):
+        self._observe(self.t, self._obs)
+
+    def _observe(self, t, out=None):
+        if self.features is not None:
+            return self.features.gather_rows(t, out)
+        return self.data.gather_windows("close", t, out)
+
+    def close(self):
+        pass
+
+    def seed(self, seed=None):
+        seeds = spawn_seeds(seed, self.num_envs + 1)
+        self.rng = make_generator(seeds[0])
+        self.rngs = [BlockRNG(make_generator(s)) for s in seeds[1:]]
+        return [seed] * self.num_envs
+
+    def _indices(self, indices):
+        if indices is None:
+            return range(self.num_envs)
+        if isinstance(indices, int):
+            return [indices]
+        return indices
+
+    def get_attr(self, attr_name, indices=None):
+        value = getattr(self, attr_name)
+        # Per-env state arrays are split per index; everything else is shared
+        if isinstance(value, np.ndarray) and value.shape[:1] == (self.num_envs,):
+            return [value[i] for i in self._indices(indices)]
+        return [value for _ in self._indices(indices)]
+
+    def set_attr(self, attr_name, value, indices=None):
+        current = getattr(self, attr_name, None)
+        if isinstance(current, np.ndarray) and current.shape[:1] == (self.num_envs,):
+            current[list(self._indices(indices))] = value
+        else:
+            setattr(self, attr_name, value)
+
+    def env_method(self, method_name, *method_args, indices=None, **method_kwargs):
+        result = getattr(self, method_name)(*method_args, **method_kwargs)
+        return [result for _ in self._indices(indices)]
+
+    def env_is_wrapped(self, wrapper_class, indices=None):
+        return [False for _ in self._indices(indices)]
+
+
+def benchmark(n_envs=64, steps=2000):
+    from stable_baselines3.common.vec_env import DummyVecEnv
+    from ddx_trading_env import TradingEnv
+
+    results = {}
+    for name, env in (("dummy", DummyVecEnv([lambda: TradingEnv() for _ in range(n_envs)])),
+                      ("vec", VecTradingEnv(n_envs=n_envs))):
+        env.reset()
+        actions = np.random.randint(0, 3, size=(steps, n_envs))
+        start = time.perf_counter()
+        for t in range(steps):
+            env.step(actions[t])
+        results[name] = n_envs * steps / (time.perf_counter() - start)
+        env.close()
+        print(f"[DDx VecEnv] {name:5s} n_envs={n_envs}: {results[name]:,.0f} steps/sec")
+    print(f"[DDx VecEnv] speedup: {results['vec'] / results['dummy']:.1f}x")
+    return results
+
+
+if __name__ == "__main__":
+    n_envs = 64
+    if "--n-envs" in sys.argv:
+        idx = sys.argv.index("--n-envs") + 1
+        n_envs = int(sys.argv[idx])
+    benchmark(n_envs=n_envs)
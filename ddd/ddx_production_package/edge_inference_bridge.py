@@ -1,27 +1,1097 @@
 #!/usr/bin/env python3
+import os
 import sys
+import json
+import signal
+import time
+import asyncio
+import queue
+import socket
+import struct
+import bisect
+import itertools
+import hmac
+import hashlib
+import threading
+import subprocess
+import http.client
+from urllib.parse import urlsplit
+from concurrent.futures import Future, ThreadPoolExecutor
 import numpy as np
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify
+from werkzeug.datastructures import MIMEAccept
+from werkzeug.http import parse_accept_header
 import onnxruntime as ort
 
 app = Flask(__name__)
-session = None
+model = None
+reloader = None
+batcher = None
+executor = None
+admin_token = None
+startup_error = None
+shutdown_hooks = []
+
+BATCH_SIZE_BUCKETS = [1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024]
+LATENCY_BUCKETS = [0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.]
+PROMETHEUS_MIMETYPE = "text/plain; version=0.0.4"
+
+# Binary wire formats. RAW bodies are a little-endian <uint32 rows, uint32 cols>
+# header followed by rows * cols little-endian float32 values; NPY bodies are
+# a serialized .npy array. Binary responses are packed little-endian int32 actions.
+RAW_MIMETYPE = "application/octet-stream"
+NPY_MIMETYPE = "application/x-npy"
+RAW_HEADER = struct.Struct("<II")
+JSON_MIMETYPE = "application/json"
+
+
+def get_arg(flag, default, cast=str, env=None):
+    # Command-line flags win over environment variables (handy for K8s pod specs)
+    if flag in sys.argv:
+        idx = sys.argv.index(flag) + 1
+        return cast(sys.argv[idx])
+    if env and os.environ.get(env):
+        return cast(os.environ[env])
+    return default
+
+
+def get_flag(flag, env=None):
+    if flag in sys.argv:
+        return True
+    return bool(env) and os.environ.get(env, "").lower() in ("1", "true", "yes", "on")
+
+
+GRAPH_OPT_LEVELS = {
+    "disable": ort.GraphOptimizationLevel.ORT_DISABLE_ALL,
+    "basic": ort.GraphOptimizationLevel.ORT_ENABLE_BASIC,
+    "extended": ort.GraphOptimizationLevel.ORT_ENABLE_EXTENDED,
+    "all": ort.GraphOptimizationLevel.ORT_ENABLE_ALL,
+}
+EXECUTION_MODES = {
+    "sequential": ort.ExecutionMode.ORT_SEQUENTIAL,
+    "parallel": ort.ExecutionMode.ORT_PARALLEL,
+}
+
+
+def parse_sizes(value):
+    return [int(v) for v in str(value).split(",") if v.strip()]
+
+
+MODEL_VARIANTS = ("float", "int8")
+
+
+def model_variant_path(path, variant):
+    # ddx_quantize.py writes the INT8 copy of ddx_model.onnx / ddx_model.ort as ddx_model.int8.onnx
+    if variant not in MODEL_VARIANTS:
+        raise SystemExit(f"[DDx Inference] --model-variant must be one of {list(MODEL_VARIANTS)}, got {variant!r}")
+    if variant == "float":
+        return path
+    return os.path.splitext(path)[0] + ".int8.onnx"
+
+
+def session_config():
+    """ORT session tuning and warmup settings from CLI flags or DDX_* environment variables."""
+    return {
+        "warmup_batch_sizes": get_arg("--warmup-batch-sizes", [1, 8, 32], parse_sizes, env="DDX_WARMUP_BATCH_SIZES"),
+        "warmup_iters": get_arg("--warmup-iters", 5, int, env="DDX_WARMUP_ITERS"),
+        "intra_op_threads": get_arg("--intra-op-threads", 0, int, env="DDX_ORT_INTRA_OP_THREADS"),
+        "inter_op_threads": get_arg("--inter-op-threads", 0, int, env="DDX_ORT_INTER_OP_THREADS"),
+        "graph_opt_level": get_arg("--graph-opt-level", "all", env="DDX_ORT_GRAPH_OPT_LEVEL"),
+        "execution_mode": get_arg("--execution-mode", "sequential", env="DDX_ORT_EXECUTION_MODE"),
+        "mem_pattern": not get_flag("--no-mem-pattern", env="DDX_ORT_NO_MEM_PATTERN"),
+        "cpu_arena": not get_flag("--no-cpu-arena", env="DDX_ORT_NO_CPU_ARENA"),
+        "optimized_model_path": get_arg("--optimized-model-path", None, env="DDX_ORT_OPTIMIZED_MODEL_PATH"),
+        "profile": get_flag("--profile", env="DDX_ORT_PROFILE"),
+        "profile_prefix": get_arg("--profile-prefix", "ddx_ort_profile", env="DDX_ORT_PROFILE_PREFIX"),
+    }
+
+
+def build_session(model_path, config, sha256):
+    if config["graph_opt_level"] not in GRAPH_OPT_LEVELS:
+        raise SystemExit(f"[DDx Inference] --graph-opt-level must be one of {sorted(GRAPH_OPT_LEVELS)}")
+    if config["execution_mode"] not in EXECUTION_MODES:
+        raise SystemExit(f"[DDx Inference] --execution-mode must be one of {sorted(EXECUTION_MODES)}")
+    opts = ort.SessionOptions()
+    # 0 keeps ORT's default (one thread per physical core), which oversubscribes small pods
+    opts.intra_op_num_threads = config["intra_op_threads"]
+    opts.inter_op_num_threads = config["inter_op_threads"]
+    opts.execution_mode = EXECUTION_MODES[config["execution_mode"]]
+    opts.graph_optimization_level = GRAPH_OPT_LEVELS[config["graph_opt_level"]]
+    opts.enable_mem_pattern = config["mem_pattern"]
+    opts.enable_cpu_mem_arena = config["cpu_arena"]
+    load_path = model_path
+    optimized = config["optimized_model_path"]
+    if optimized and model_path.endswith(".ort"):
+        # ORT-format models (ddx_export.py) are saved with the graph optimizations already applied
+        print(f"[DDx Inference] {model_path} is pre-optimized, ignoring the optimized model path")
+        optimized = None
+    # The cached graph is only reused if the sidecar records the sha256 of the model it was optimized from;
+    # mtimes can't tell a rollback, a /reload to another file or an mtime-preserving copy apart
+    stamp = optimized + ".sha256" if optimized else None
+    if optimized:
+        if os.path.exists(optimized) and read_text(stamp) == sha256:
+            # Reuse the graph optimized by a previous start instead of re-running the optimizers
+            load_path = optimized
+            opts.graph_optimization_level = ort.GraphOptimizationLevel.ORT_DISABLE_ALL
+            print(f"[DDx Inference] Loading pre-optimized graph: {optimized}")
+        else:
+            if os.path.exists(stamp):
+                os.remove(stamp)
+            opts.optimized_model_filepath = optimized
+            print(f"[DDx Inference] Saving optimized graph to: {optimized}")
+    if config["profile"]:
+        opts.enable_profiling = True
+        opts.profile_file_prefix = config["profile_prefix"]
+    sess = ort.InferenceSession(load_path, sess_options=opts)
+    if optimized and load_path != optimized:
+        with open(stamp + ".tmp", "w") as f:
+            f.write(sha256)
+        os.replace(stamp + ".tmp", stamp)
+    return sess
+
+
+def read_text(path):
+    try:
+        with open(path) as f:
+            return f.read().strip()
+    except OSError:
+        return None
+
+
+def dump_profile(sess):
+    trace = sess.end_profiling()
+    if trace:
+        print(f"[DDx Inference] ORT profile written to {trace}")
+
+
+METRIC_STRIPES = 16
+_stripe = threading.local()
+_next_stripe = itertools.count()
+
+
+def thread_stripe():
+    # Round-robin over the stripes, fixed per thread on its first update; next() on a count needs no lock
+    index = getattr(_stripe, "index", None)
+    if index is None:
+        index = _stripe.index = next(_next_stripe) % METRIC_STRIPES
+    return index
+
+
+class Metric:
+    """Base for striped metrics: a fixed set of shards, each with its own lock.
+
+    observe()/inc() update the calling thread's stripe, so concurrent
+    requests rarely wait on the same lock and nothing is allocated per
+    thread (Flask spawns one per request); collect() merges the shards at
+    scrape time.
+    """
+
+    def __init__(self, name, help_text):
+        self.name = name
+        self.help = help_text
+        self._shards = [self._new_shard() for _ in range(METRIC_STRIPES)]
+        self._locks = [threading.Lock() for _ in range(METRIC_STRIPES)]
+        REGISTRY.append(self)
+
+    def _stripe(self):
+        index = thread_stripe()
+        return self._locks[index], self._shards[index]
+
+    def collect(self):
+        total = self._new_shard()
+        for lock, shard in zip(self._locks, self._shards):
+            with lock:
+                self._merge(total, shard)
+        return total
+
+
+class Counter(Metric):
+    """Monotonic counter keyed by a tuple of label values."""
+
+    def __init__(self, name, help_text, labelnames=()):
+        self.labelnames = tuple(labelnames)
+        super().__init__(name, help_text)
+
+    def _new_shard(self):
+        return {}
+
+    def _merge(self, into, shard):
+        for key, value in shard.items():
+            into[key] = into.get(key, 0.) + value
+
+    def inc(self, labels=(), amount=1.):
+        lock, shard = self._stripe()
+        with lock:
+            shard[labels] = shard.get(labels, 0.) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        for key, value in sorted(self.collect().items()):
+            lines.append(f"{self.name}{format_labels(zip(self.labelnames, key))} {value:g}")
+        return lines
+
+
+class Histogram(Metric):
+    """Fixed-bucket histogram (upper bounds are inclusive, like Prometheus)."""
+
+    def __init__(self, name, help_text, buckets):
+        self.buckets = list(buckets)
+        super().__init__(name, help_text)
+
+    def _new_shard(self):
+        # bucket counts (last one is +Inf), then sum, then count
+        return [0] * (len(self.buckets) + 1) + [0., 0]
+
+    def _merge(self, into, shard):
+        for i, value in enumerate(shard):
+            into[i] += value
+
+    def observe(self, value):
+        bucket = bisect.bisect_left(self.buckets, value)
+        lock, shard = self._stripe()
+        with lock:
+            shard[bucket] += 1
+            shard[-2] += value
+            shard[-1] += 1
+
+    def snapshot(self):
+        merged = self.collect()
+        cumulative, buckets = 0, {}
+        for le, c in zip(self.buckets + ["+Inf"], merged[:-2]):
+            cumulative += c
+            buckets[str(le)] = cumulative
+        return {"buckets": buckets, "count": merged[-1], "sum": merged[-2]}
+
+    def render(self):
+        snap = self.snapshot()
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for le, c in snap["buckets"].items():
+            lines.append(f'{self.name}_bucket{{le="{le}"}} {c}')
+        lines.append(f"{self.name}_sum {snap['sum']:g}")
+        lines.append(f"{self.name}_count {snap['count']}")
+        return lines
+
+
+def format_labels(pairs):
+    pairs = [(k, str(v).replace("\\", "\\\\").replace('"', '\\"')) for k, v in pairs]
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in pairs) + "}"
+
+
+REGISTRY = []
+REQUESTS = Counter("ddx_requests_total", "Inference requests by route and HTTP status.", ("route", "status"))
+ERRORS = Counter("ddx_request_errors_total", "Inference requests answered with a 4xx/5xx status.", ("route", "status"))
+REQUEST_LATENCY = Histogram("ddx_request_latency_seconds", "End-to-end inference handler latency.", LATENCY_BUCKETS)
+DECODE_LATENCY = Histogram("ddx_decode_seconds", "Request body decode and validation time.", LATENCY_BUCKETS)
+RUN_LATENCY = Histogram("ddx_session_run_seconds", "Time spent inside session.run per batch.", LATENCY_BUCKETS)
+ENCODE_LATENCY = Histogram("ddx_encode_seconds", "Response encode time.", LATENCY_BUCKETS)
+QUEUE_WAIT = Histogram("ddx_queue_wait_seconds", "Time a request waited in the micro-batcher queue.", LATENCY_BUCKETS)
+BATCH_SIZE = Histogram("ddx_batch_size", "Rows per session.run call.", BATCH_SIZE_BUCKETS)
+
+
+class MicroBatcher:
+    """Coalesces concurrent requests into a single session.run call.
+
+    A batch is dispatched once it holds max_batch rows or once the oldest
+    queued request has waited max_wait_ms, whichever comes first. Requests
+    are only batched with others validated against the same LoadedModel, so
+    a reload never runs a request on a session it wasn't checked against.
+    """
+
+    def __init__(self, max_batch=32, max_wait_ms=2.0):
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000.
+        self.queue = queue.Queue()
+        self._thread = threading.Thread(target=self._loop, name="ddx-batcher", daemon=True)
+        self._thread.start()
+
+    def submit(self, loaded, obs, outputs=()):
+        # obs: [n, obs_dim] float32 checked against `loaded`; the future resolves to its rows of predict()
+        future = Future()
+        self.queue.put((loaded, obs, time.perf_counter(), future, outputs))
+        return future
+
+    def _loop(self):
+        pending = None
+        while True:
+            first, pending = pending or self.queue.get(), None
+            loaded = first[0]
+            items, rows = [first], len(first[1])
+            deadline = first[2] + self.max_wait
+            # Per batch: a hot-reloaded model may have a fixed batch dimension
+            limit = min(self.max_batch, loaded.batch_dim or self.max_batch)
+            while rows < limit:
+                timeout = deadline - time.perf_counter()
+                if timeout <= 0:
+                    break
+                try:
+                    item = self.queue.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                if item[0] is not loaded:
+                    # Validated against the model on the other side of a reload; it starts the next batch
+                    pending = item
+                    break
+                items.append(item)
+                rows += len(item[1])
+            self._run(loaded, items)
+
+    def _run(self, loaded, items):
+        start = time.perf_counter()
+        for _, _, enqueued, _, _ in items:
+            QUEUE_WAIT.observe(start - enqueued)
+        # One run fetches every extra output any request in the batch asked for
+        outputs = sorted({name for item in items for name in item[4]})
+        try:
+            results = predict(loaded, loaded.batch_input([item[1] for item in items]), outputs)
+        except Exception as exc:
+            for _, _, _, future, _ in items:
+                future.set_exception(exc)
+            return
+        offset = 0
+        for _, item_obs, _, future, _ in items:
+            end = offset + len(item_obs)
+            future.set_result({k: v[offset:end] for k, v in results.items()})
+            offset = end
+
+
+def describe_input(sess):
+    # Returns (batch_dim, obs_dim); symbolic/dynamic dimensions come back as None.
+    # Multi-asset models take [batch, K, F]; requests send rows flattened to K * F.
+    shape = sess.get_inputs()[0].shape
+    dims = [d if isinstance(d, int) and d > 0 else None for d in shape]
+    if len(dims) > 2:
+        return dims[0], None if None in dims[1:] else int(np.prod(dims[1:]))
+    return dims[0], dims[-1]
+
+
+def input_row_shape(sess):
+    # Per-observation shape when the model takes more than a flat vector, else None
+    dims = sess.get_inputs()[0].shape[1:]
+    if len(dims) > 1 and all(isinstance(d, int) and d > 0 for d in dims):
+        return tuple(dims)
+    return None
+
+
+def check_input_metadata(sess, shape):
+    # The graph's per-row dims must agree with the obs_shape stamped at export wherever they are static
+    dims = sess.get_inputs()[0].shape[1:]
+    if len(dims) != len(shape) or any(isinstance(d, int) and d > 0 and d != n for d, n in zip(dims, shape)):
+        raise ValueError(f"model input {dims} does not match its obs_shape metadata {list(shape)}")
+
+
+class LoadedModel:
+    """An InferenceSession plus the identity reported at /model.
+
+    Handlers take one reference to the module-level `model` per request and
+    pass it through validation, batching and predict(), so swapping it is
+    atomic and in-flight requests finish on the session they started with.
+    """
+
+    def __init__(self, sess, path, sha256):
+        self.session = sess
+        self.path = path
+        self.sha256 = sha256
+        self.batch_dim, self.obs_dim = describe_input(sess)
+        self.row_shape = input_row_shape(sess)
+        meta = sess.get_modelmeta()
+        version = meta.custom_metadata_map.get("version")
+        if not version and 0 < meta.version < 2 ** 63 - 1:
+            version = str(meta.version)
+        self.version = version or "unversioned"
+        # Stamped by rl_train_master.py when trained on a feature store; clients must send matching rows
+        self.feature_set_version = meta.custom_metadata_map.get("feature_set_version")
+        # Portfolio models (ddx_portfolio_env.py) emit one action per asset
+        self.n_assets = int(meta.custom_metadata_map.get("n_assets", 1))
+        # Set by ddx_quantize.py on INT8 variants, with the action agreement they passed
+        self.quantization = meta.custom_metadata_map.get("quantization", "float")
+        self.action_agreement = meta.custom_metadata_map.get("action_agreement")
+        # Input shape, action layout and normalization stats stamped by rl_train_master.py; the obs shape
+        # overrides symbolic graph dims, so requests are validated and buffers sized without guessing
+        custom = meta.custom_metadata_map
+        if "obs_shape" in custom:
+            shape = tuple(json.loads(custom["obs_shape"]))
+            check_input_metadata(sess, shape)
+            self.obs_dim = int(np.prod(shape))
+            self.row_shape = shape if len(shape) > 1 else None
+        self.action_type = custom.get("action_type")
+        self.action_mapping = json.loads(custom["action_mapping"]) if "action_mapping" in custom else None
+        self.normalization = json.loads(custom["normalization"]) if "normalization" in custom else None
+        self.feed = None
+        # The first output is the action head: int64 actions from ddx_export.py's actor graph, or
+        # logits from older exports. Other outputs (logits, value) are only fetched when asked for.
+        self.outputs = [o.name for o in sess.get_outputs()]
+        self.action_output = self.outputs[0]
+        self.logits_head = self.action_type != "weights" and "int" not in sess.get_outputs()[0].type
+        self.loaded_at = time.time()
+        self.warmup_seconds = 0.
+
+    def info(self):
+        return {
+            "warmup_seconds": self.warmup_seconds,
+            "path": self.path,
+            "sha256": self.sha256,
+            "version": self.version,
+            "feature_set_version": self.feature_set_version,
+            "loaded_at": self.loaded_at,
+            "batch_dim": self.batch_dim,
+            "obs_dim": self.obs_dim,
+            "n_assets": self.n_assets,
+            "outputs": self.outputs,
+            "quantization": self.quantization,
+            "action_agreement": self.action_agreement,
+            "action_type": self.action_type,
+            "action_mapping": self.action_mapping,
+            "normalization": self.normalization,
+        }
+
+    def allocate(self, rows):
+        # Micro-batches are gathered into one preallocated float32 buffer; needs a known obs_dim
+        if self.obs_dim is not None:
+            self.feed = np.empty((rows, self.obs_dim), dtype=np.float32)
+
+    def batch_input(self, parts):
+        # Only the batcher thread calls this, so the buffer is never shared between two runs
+        rows = sum(len(p) for p in parts)
+        if self.feed is None:
+            return np.concatenate(parts, axis=0)
+        if rows > len(self.feed):
+            self.allocate(rows)
+        return np.concatenate(parts, axis=0, out=self.feed[:rows])
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def warmup(loaded, batch_sizes, iters):
+    # Runs synthetic batches at every configured size so allocator arenas and kernel
+    # selection are settled before the first real request
+    start = time.perf_counter()
+    if loaded.batch_dim is not None:
+        batch_sizes = [loaded.batch_dim]
+    rng = np.random.default_rng(0)
+    for size in batch_sizes:
+        obs = rng.standard_normal((size,) + (loaded.row_shape or (loaded.obs_dim or 1,))).astype(np.float32)
+        for _ in range(max(1, iters)):
+            loaded.session.run([loaded.action_output], {"obs": obs})
+    loaded.warmup_seconds = time.perf_counter() - start
+    print(f"[DDx Inference] Warmup done in {loaded.warmup_seconds:.3f}s "
+          f"(batch sizes {batch_sizes} x {max(1, iters)} runs)")
+
+
+def load_model(path, config):
+    sha256 = file_sha256(path)
+    loaded = LoadedModel(build_session(path, config, sha256), path, sha256)
+    loaded.allocate(max(config["warmup_batch_sizes"] or [1]))
+    warmup(loaded, config["warmup_batch_sizes"], config["warmup_iters"])
+    return loaded
+
+
+def start_model(path, config):
+    # Runs in the background so /healthz answers while the session loads and warms up
+    global model, startup_error
+    try:
+        loaded = load_model(path, config)
+    except Exception as exc:
+        startup_error = f"{type(exc).__name__}: {exc}"
+        print(f"[DDx Inference] Failed to load {path}: {startup_error}")
+        return
+    model = loaded
+    print(f"[DDx Inference] Ready: sha256={model.sha256[:12]} version={model.version} "
+          f"batch_dim={model.batch_dim or 'dynamic'} obs_dim={model.obs_dim}")
+
+
+class ModelReloader:
+    """Builds and warms a new session off the request path, then swaps it in.
+
+    Triggered by POST /reload or, with watch_interval > 0, by polling the
+    model file's mtime/size.
+    """
+
+    def __init__(self, config, watch_interval=0.):
+        self.config = config
+        self.watch_interval = watch_interval
+        self.reloads = 0
+        self.last_error = None
+        self._lock = threading.Lock()
+        if watch_interval > 0:
+            threading.Thread(target=self._watch, name="ddx-model-watch", daemon=True).start()
+
+    def reload(self, path=None, blocking=True):
+        global model
+        if model is None:
+            raise RuntimeError("initial model is not loaded yet")
+        if not self._lock.acquire(blocking=blocking):
+            return None
+        try:
+            current = model
+            path = path or current.path
+            if path == current.path and file_sha256(path) == current.sha256:
+                return current
+            print(f"[DDx Inference] Reloading ONNX model: {path}")
+            try:
+                fresh = load_model(path, self.config)
+            except Exception as exc:
+                # Keep serving the old model if the new file is missing or broken
+                self.last_error = f"{type(exc).__name__}: {exc}"
+                print(f"[DDx Inference] Reload failed, keeping {current.sha256[:12]}: {self.last_error}")
+                raise
+            model = fresh
+            self.reloads += 1
+            self.last_error = None
+            if self.config["profile"]:
+                dump_profile(current.session)
+            print(f"[DDx Inference] Now serving {fresh.path} (sha256 {fresh.sha256[:12]}, version {fresh.version})")
+            return fresh
+        finally:
+            self._lock.release()
+
+    def _watch(self):
+        last = None
+        while True:
+            time.sleep(self.watch_interval)
+            if model is None:
+                continue
+            try:
+                st = os.stat(model.path)
+            except OSError:
+                continue
+            stamp = (st.st_mtime_ns, st.st_size)
+            if last is not None and stamp != last:
+                try:
+                    self.reload(blocking=False)
+                except Exception:
+                    pass
+            last = stamp
+
+
+def validate_obs(loaded, obs):
+    batch_dim, obs_dim = loaded.batch_dim, loaded.obs_dim
+    if obs.ndim != 2 or len(obs) == 0:
+        raise ValueError(f"obs must be a non-empty [N, obs_dim] array (or one [obs_dim] observation on /infer), "
+                         f"got shape {list(obs.shape)}")
+    if obs_dim is not None and obs.shape[1] != obs_dim:
+        raise ValueError(f"obs_dim mismatch: model expects {obs_dim}, got {obs.shape[1]}")
+    if batch_dim is not None and obs.shape[0] != batch_dim:
+        raise ValueError(f"model has a fixed batch size of {batch_dim}, got {obs.shape[0]} observations")
+
+
+def predict(loaded, obs, requested=()):
+    # Runs only the action head plus the requested outputs the model has
+    BATCH_SIZE.observe(len(obs))
+    start = time.perf_counter()
+    feed = obs if loaded.row_shape is None else obs.reshape((len(obs),) + loaded.row_shape)
+    names = [loaded.action_output] + [n for n in requested if n in loaded.outputs and n != loaded.action_output]
+    outputs = dict(zip(names, loaded.session.run(names, {"obs": feed})))
+    RUN_LATENCY.observe(time.perf_counter() - start)
+    head = outputs[loaded.action_output]
+    results = {"actions": pick_actions(head, loaded.n_assets, loaded.action_type)}
+    if not np.issubdtype(head.dtype, np.integer):
+        results["logits"] = head
+    if "logits" in outputs:
+        results["logits"] = outputs["logits"]
+    if "value" in outputs:
+        results["value"] = outputs["value"].reshape(len(obs), -1)[:, 0]
+    return results
+
+
+def pick_actions(head, n_assets, action_type=None):
+    # Integer heads and portfolio weights are already actions; logits get an argmax per asset
+    if action_type == "weights":
+        return head if n_assets > 1 else head.reshape(len(head))
+    if np.issubdtype(head.dtype, np.integer):
+        return head if n_assets > 1 else head.reshape(len(head))
+    if n_assets > 1:
+        return np.argmax(head.reshape(len(head), n_assets, -1), axis=2)
+    return np.argmax(head, axis=1)
+
+
+def run_inference(loaded, obs, outputs=()):
+    if batcher is None:
+        return predict(loaded, obs, outputs)
+    return batcher.submit(loaded, obs, outputs).result()
+
+
+def check_outputs(loaded, requested):
+    # Checked before the request takes a batch slot; older exports whose action head is logits also answer "logits"
+    if not isinstance(requested, list) or not all(isinstance(name, str) for name in requested):
+        raise ValueError('outputs must be a list of output names, e.g. ["logits", "value"]')
+    for name in requested:
+        if name not in ("logits", "value"):
+            raise ValueError(f"unknown output {name!r}, expected 'logits' or 'value'")
+        if name not in loaded.outputs and not (name == "logits" and loaded.logits_head):
+            raise ValueError(f"model does not produce a {name!r} output")
+
+
+def batch_response(results, requested):
+    body = {"actions": results["actions"].tolist()}
+    for name in requested:
+        body[name] = results[name].tolist()
+    return body
+
+
+def decode_binary(content_type, body):
+    # Wraps the request body with np.frombuffer (no copy); returns None for non-binary bodies
+    mimetype = (content_type or "").split(";")[0].strip().lower()
+    if mimetype == RAW_MIMETYPE:
+        if len(body) < RAW_HEADER.size:
+            raise ValueError("binary body is shorter than its shape header")
+        rows, cols = RAW_HEADER.unpack_from(body)
+        if len(body) != RAW_HEADER.size + rows * cols * 4:
+            raise ValueError(f"binary body size does not match header shape [{rows}, {cols}]")
+        return np.frombuffer(body, dtype="<f4", count=rows * cols, offset=RAW_HEADER.size).reshape(rows, cols)
+    if mimetype == NPY_MIMETYPE:
+        buf = memoryview(body)
+        reader = _BufferReader(buf)
+        major, _ = np.lib.format.read_magic(reader)
+        read_header = np.lib.format.read_array_header_1_0 if major == 1 else np.lib.format.read_array_header_2_0
+        shape, fortran_order, dtype = read_header(reader)
+        if dtype.hasobject or fortran_order:
+            raise ValueError("npy body must be a C-ordered numeric array")
+        count = int(np.prod(shape))
+        obs = np.frombuffer(buf, dtype=dtype, count=count, offset=reader.pos).reshape(shape)
+        return obs.astype(np.float32, copy=False)
+    return None
+
+
+class _BufferReader:
+    """Minimal file-like cursor so np.lib.format can parse an .npy header in place."""
+
+    def __init__(self, buf):
+        self.buf, self.pos = buf, 0
+
+    def read(self, size):
+        chunk = bytes(self.buf[self.pos:self.pos + size])
+        self.pos += len(chunk)
+        return chunk
+
+
+def encode_actions(actions):
+    # int32 actions, or float32 for weights models; [N, K] portfolio actions are flattened row-major
+    dtype = "<f4" if np.issubdtype(actions.dtype, np.floating) else "<i4"
+    return np.ascontiguousarray(actions, dtype=dtype).tobytes()
+
+
+def wants_binary(accept, request_was_binary):
+    # Binary requests get binary replies unless JSON is preferred; JSON requests must opt in
+    if request_was_binary:
+        return not accept.provided or accept[RAW_MIMETYPE] >= accept[JSON_MIMETYPE]
+    return accept.provided and accept[RAW_MIMETYPE] > accept[JSON_MIMETYPE]
+
+
+def json_reply(status, body):
+    return status, JSON_MIMETYPE, json.dumps(body).encode()
+
+
+def check_feature_set(loaded, requested):
+    # Requests that name a feature set must match the one the model was trained on
+    expected = loaded.feature_set_version
+    if requested and expected and requested != expected:
+        raise ValueError(f"feature set {requested!r} does not match model feature set {expected!r}")
+
+
+def handle_infer(body, content_type, accept_header, batch_route, feature_set=None):
+    # Shared by the Flask and ASGI front-ends; returns (status, mimetype, body bytes)
+    route = "/infer_batch" if batch_route else "/infer"
+    start = time.perf_counter()
+    status, mimetype, reply = _handle_infer(body, content_type, accept_header, batch_route, feature_set)
+    REQUEST_LATENCY.observe(time.perf_counter() - start)
+    REQUESTS.inc((route, status))
+    if status >= 400:
+        ERRORS.inc((route, status))
+    return status, mimetype, reply
+
+
+def _handle_infer(body, content_type, accept_header, batch_route, feature_set):
+    # The model this request is validated against and run on, even if a reload swaps it meanwhile
+    loaded = model
+    if loaded is None:
+        return not_ready()
+    accept = parse_accept_header(accept_header, MIMEAccept)
+    try:
+        start = time.perf_counter()
+        obs = decode_binary(content_type, body)
+        binary = obs is not None
+        payload = {} if binary else (json.loads(body) if body else {})
+        if not isinstance(payload, dict):
+            raise ValueError('JSON body must be an object, e.g. {"obs": [...]}')
+        if not binary:
+            obs = np.array(payload.get("obs", []), dtype=np.float32)
+        # A single [obs_dim] observation on /infer, as JSON or .npy
+        single = obs.ndim == 1 and not batch_route
+        if single:
+            # [batch, ...] shape if needed
+            obs = np.expand_dims(obs, axis=0)
+        check_feature_set(loaded, payload.get("feature_set_version") or feature_set)
+        validate_obs(loaded, obs)
+        # Only JSON batch replies carry outputs besides the actions
+        outputs = payload.get("outputs", []) if not single else []
+        check_outputs(loaded, outputs)
+        DECODE_LATENCY.observe(time.perf_counter() - start)
+        results = run_inference(loaded, obs, tuple(outputs))
+        start = time.perf_counter()
+        if wants_binary(accept, binary):
+            reply = 200, RAW_MIMETYPE, encode_actions(results["actions"])
+        elif single:
+            reply = json_reply(200, {"action": results["actions"][0].tolist()})
+        else:
+            reply = json_reply(200, batch_response(results, outputs))
+        ENCODE_LATENCY.observe(time.perf_counter() - start)
+        return reply
+    except ValueError as exc:
+        return json_reply(400, {"error": str(exc)})
+    except Exception as exc:
+        return json_reply(500, {"error": f"{type(exc).__name__}: {exc}"})
+
+
+def stats_body():
+    body = {"ready": model is not None, "warmup_seconds": model.warmup_seconds if model else None}
+    if batcher is None:
+        body["batching"] = False
+        return body
+    return {
+        **body,
+        "batching": True,
+        "max_batch": batcher.max_batch,
+        "max_wait_ms": batcher.max_wait * 1000.,
+        "batch_size": BATCH_SIZE.snapshot(),
+        "queue_wait_seconds": QUEUE_WAIT.snapshot(),
+    }
+
+
+def metrics_text():
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    loaded = model
+    gauges = [
+        ("ddx_model_ready", "1 once the model is loaded and warmed up.", 1 if loaded else 0, ()),
+        ("ddx_warmup_seconds", "Duration of the last model warmup.", loaded.warmup_seconds if loaded else 0, ()),
+        ("ddx_model_reloads", "Successful hot reloads since start.", reloader.reloads if reloader else 0, ()),
+    ]
+    if loaded:
+        gauges.append(("ddx_model_info", "Active model identity.", 1,
+                       (("sha256", loaded.sha256), ("version", loaded.version))))
+    for name, help_text, value, labels in gauges:
+        lines += [f"# HELP {name} {help_text}", f"# TYPE {name} gauge", f"{name}{format_labels(labels)} {value:g}"]
+    return 200, PROMETHEUS_MIMETYPE, ("\n".join(lines) + "\n").encode()
+
+
+def not_ready():
+    return json_reply(503, {"error": startup_error or "model is loading / warming up"})
+
+
+def health():
+    # Liveness: only a failed initial load is fatal (lets Kubernetes restart the pod)
+    if startup_error:
+        return json_reply(500, {"status": "failed", "error": startup_error})
+    return json_reply(200, {"status": "ok"})
+
+
+def readiness():
+    if model is None:
+        return not_ready()
+    return json_reply(200, {"status": "ready", "warmup_seconds": model.warmup_seconds})
+
+
+def handle_reload(body, token):
+    if model is None:
+        return not_ready()
+    if not admin_token:
+        # Without a token anyone who can reach the port could swap in any file the pod can read
+        return json_reply(403, {"error": "reload is disabled: no --admin-token / DDX_ADMIN_TOKEN configured"})
+    if not hmac.compare_digest((token or "").encode(), admin_token.encode()):
+        return json_reply(403, {"error": "missing or invalid X-DDx-Admin-Token"})
+    try:
+        path = (json.loads(body) if body else {}).get("path")
+        loaded = reloader.reload(path, blocking=False)
+    except Exception as exc:
+        return json_reply(500, {"error": f"reload failed: {exc}", "model": model.info()})
+    if loaded is None:
+        return json_reply(409, {"error": "a reload is already in progress"})
+    return json_reply(200, model_body())
+
+
+def model_body():
+    if model is None:
+        return {"ready": False, "error": startup_error}
+    body = model.info()
+    body["reloads"] = reloader.reloads
+    body["last_reload_error"] = reloader.last_error
+    return body
+
+
+def flask_reply(status, mimetype, body):
+    return Response(body, status=status, mimetype=mimetype)
+
 
 @app.route('/infer', methods=['POST'])
 def infer():
-    data = request.json.get("obs", [])
-    obs = np.array(data, dtype=np.float32)
-    # [batch, ...] shape if needed
-    obs = np.expand_dims(obs, axis=0)
-    outputs = session.run(None, {"obs": obs})
-    # outputs: [action, value], each is a numpy array
-    # For discrete action, let's pick argmax
-    action_logits = outputs[0]
-    action = int(np.argmax(action_logits, axis=1)[0])
-    return jsonify({"action": action})
+    return flask_reply(*handle_infer(request.get_data(), request.content_type,
+                                     request.headers.get("Accept"), batch_route=False,
+                                     feature_set=request.headers.get("X-DDx-Feature-Set")))
+
+
+@app.route('/infer_batch', methods=['POST'])
+def infer_batch():
+    return flask_reply(*handle_infer(request.get_data(), request.content_type,
+                                     request.headers.get("Accept"), batch_route=True,
+                                     feature_set=request.headers.get("X-DDx-Feature-Set")))
+
+
+@app.route('/stats', methods=['GET'])
+def stats():
+    return jsonify(stats_body())
+
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    return flask_reply(*metrics_text())
+
+
+@app.route('/healthz', methods=['GET'])
+def healthz():
+    return flask_reply(*health())
+
+
+@app.route('/readyz', methods=['GET'])
+def readyz():
+    return flask_reply(*readiness())
+
+
+@app.route('/model', methods=['GET'])
+def model_info():
+    return jsonify(model_body())
+
+
+@app.route('/reload', methods=['POST'])
+def reload_model():
+    return flask_reply(*handle_reload(request.get_data(), request.headers.get("X-DDx-Admin-Token")))
+
+
+async def asgi_app(scope, receive, send):
+    """Raw ASGI entry point; inference runs on the bounded `executor` thread pool."""
+    if scope["type"] == "lifespan":
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                run_shutdown_hooks()
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+    if scope["type"] != "http":
+        return
+    body, more = b"", True
+    while more:
+        message = await receive()
+        body += message.get("body", b"")
+        more = message.get("more_body", False)
+    headers = {k.decode("latin-1"): v.decode("latin-1") for k, v in scope["headers"]}
+    path, method = scope["path"], scope["method"]
+    if path in ("/infer", "/infer_batch") and method == "POST":
+        loop = asyncio.get_running_loop()
+        status, mimetype, payload = await loop.run_in_executor(
+            executor, handle_infer, body, headers.get("content-type"), headers.get("accept"),
+            path == "/infer_batch", headers.get("x-ddx-feature-set"))
+    elif path == "/stats" and method == "GET":
+        status, mimetype, payload = json_reply(200, stats_body())
+    elif path == "/metrics" and method == "GET":
+        status, mimetype, payload = metrics_text()
+    elif path == "/healthz" and method == "GET":
+        status, mimetype, payload = health()
+    elif path == "/readyz" and method == "GET":
+        status, mimetype, payload = readiness()
+    elif path == "/model" and method == "GET":
+        status, mimetype, payload = json_reply(200, model_body())
+    elif path == "/reload" and method == "POST":
+        loop = asyncio.get_running_loop()
+        status, mimetype, payload = await loop.run_in_executor(
+            None, handle_reload, body, headers.get("x-ddx-admin-token"))
+    else:
+        status, mimetype, payload = json_reply(404, {"error": f"no route for {method} {path}"})
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [(b"content-type", mimetype.encode()), (b"content-length", str(len(payload)).encode())],
+    })
+    await send({"type": "http.response.body", "body": payload})
+
+
+def run_shutdown_hooks():
+    while shutdown_hooks:
+        shutdown_hooks.pop()()
+
+
+def serve(server, host, port, workers, keep_alive):
+    global executor
+    if server == "flask":
+        # Turn SIGTERM (pod shutdown) into a normal exit so shutdown hooks still run
+        signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+        try:
+            app.run(host=host, port=port, debug=False, threaded=True)
+        finally:
+            run_shutdown_hooks()
+    elif server == "asgi":
+        import uvicorn
+        executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="ddx-infer")
+        uvicorn.run(asgi_app, host=host, port=port, lifespan="on", log_level="warning",
+                    timeout_keep_alive=keep_alive)
+    else:
+        raise SystemExit(f"[DDx Inference] Unknown --server {server!r}, expected 'flask' or 'asgi'")
+
+
+def load_test(url, concurrency=16, total_requests=2000, obs_dim=10, rows=1):
+    """Closed-loop load generator over keep-alive connections; returns rps and latency percentiles."""
+    target = urlsplit(url)
+    body = RAW_HEADER.pack(rows, obs_dim) + np.random.random((rows, obs_dim)).astype("<f4").tobytes()
+    headers = {"Content-Type": RAW_MIMETYPE}
+    per_worker = max(1, total_requests // concurrency)
+    latencies, errors = [], [0]
+    lock = threading.Lock()
+
+    def worker():
+        conn = http.client.HTTPConnection(target.hostname, target.port, timeout=30)
+        local, failed = [], 0
+        for _ in range(per_worker):
+            start = time.perf_counter()
+            try:
+                conn.request("POST", target.path or "/infer", body=body, headers=headers)
+                resp = conn.getresponse()
+                resp.read()
+                if resp.status != 200:
+                    failed += 1
+                if resp.will_close:
+                    conn.close()
+            except (OSError, http.client.HTTPException):
+                failed += 1
+                conn.close()
+                continue
+            local.append(time.perf_counter() - start)
+        conn.close()
+        with lock:
+            latencies.extend(local)
+            errors[0] += failed
+
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+    lat_ms = np.array(latencies) * 1000. if latencies else np.zeros(1)
+    return {
+        "requests": len(latencies),
+        "errors": errors[0],
+        "concurrency": concurrency,
+        "rows_per_request": rows,
+        "rps": len(latencies) / elapsed,
+        "p50_ms": float(np.percentile(lat_ms, 50)),
+        "p99_ms": float(np.percentile(lat_ms, 99)),
+    }
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def wait_until_up(port, proc, timeout=60.):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"bridge exited with code {proc.returncode} during startup")
+        try:
+            conn = http.client.HTTPConnection("127.0.0.1", port, timeout=1)
+            conn.request("GET", "/readyz")
+            resp = conn.getresponse()
+            resp.read()
+            conn.close()
+            if resp.status == 200:
+                return
+        except OSError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError("bridge did not become ready in time")
+
+
+def run_benchmark(model_path, server_args, concurrency, total_requests, rows):
+    """Starts the bridge once per server mode and load-tests each with the same traffic."""
+    batch_dim, obs_dim = describe_input(ort.InferenceSession(model_path))
+    results = {}
+    for mode in ("flask", "asgi"):
+        port = free_port()
+        cmd = [sys.executable, os.path.abspath(__file__), model_path, "--server", mode,
+               "--port", str(port), "--host", "127.0.0.1"] + server_args
+        proc = subprocess.Popen(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        try:
+            wait_until_up(port, proc)
+            load_test(f"http://127.0.0.1:{port}/infer", concurrency, concurrency * 5, obs_dim, rows)  # warmup
+            results[mode] = load_test(f"http://127.0.0.1:{port}/infer", concurrency, total_requests, obs_dim, rows)
+        finally:
+            proc.terminate()
+            proc.wait()
+        r = results[mode]
+        print(f"[DDx Bench] {mode:5s} rps={r['rps']:.0f} p50={r['p50_ms']:.2f}ms "
+              f"p99={r['p99_ms']:.2f}ms errors={r['errors']}")
+    return results
+
+
+def strip_args(argv, flags):
+    # Drops `--flag value` pairs (and bare switches) so the remaining args can be forwarded
+    out, skip = [], False
+    for arg in argv:
+        if skip:
+            skip = False
+            continue
+        if arg in flags:
+            skip = flags[arg]
+            continue
+        out.append(arg)
+    return out
+
 
 if __name__ == '__main__':
-    model_path = sys.argv[1] if len(sys.argv) > 1 else "ddx_model.onnx"
+    model_path = sys.argv[1] if len(sys.argv) > 1 and not sys.argv[1].startswith("--") else "ddx_model.onnx"
+    if "--bench" in sys.argv:
+        # Compare the Flask and ASGI servers under identical load, e.g.
+        #   edge_inference_bridge.py ddx_model.onnx --bench --bench-concurrency 32 --max-batch 32
+        forwarded = strip_args([a for a in sys.argv[1:] if a != model_path], {
+            "--bench": False, "--bench-concurrency": True, "--bench-requests": True, "--bench-rows": True,
+            "--server": True, "--port": True, "--host": True,
+        })
+        report = run_benchmark(model_path, forwarded,
+                               concurrency=get_arg("--bench-concurrency", 16, int),
+                               total_requests=get_arg("--bench-requests", 2000, int),
+                               rows=get_arg("--bench-rows", 1, int))
+        print(json.dumps(report, indent=2))
+        sys.exit(0)
+    server = get_arg("--server", "flask")
+    host = get_arg("--host", "0.0.0.0")
+    port = get_arg("--port", 8500, int)
+    workers = get_arg("--workers", 32, int)
+    keep_alive = get_arg("--keep-alive", 5, int)
+    max_batch = get_arg("--max-batch", 32, int)
+    max_wait_ms = get_arg("--max-wait-ms", 2.0, float)
+    watch_interval = get_arg("--watch-interval", 0., float, env="DDX_MODEL_WATCH_INTERVAL")
+    admin_token = get_arg("--admin-token", None, env="DDX_ADMIN_TOKEN")
+    config = session_config()
+    model_path = model_variant_path(model_path, get_arg("--model-variant", "float", env="DDX_MODEL_VARIANT"))
     print(f"[DDx Inference] Loading ONNX model: {model_path}")
-    session = ort.InferenceSession(model_path)
-    app.run(host="0.0.0.0", port=8500, debug=False)
+    threading.Thread(target=start_model, args=(model_path, config), name="ddx-startup", daemon=True).start()
+    reloader = ModelReloader(config, watch_interval=watch_interval)
+    if config["profile"]:
+        shutdown_hooks.append(lambda: model and dump_profile(model.session))
+    if max_batch > 1:
+        batcher = MicroBatcher(max_batch=max_batch, max_wait_ms=max_wait_ms)
+        print(f"[DDx Inference] Micro-batching enabled: max_batch={max_batch}, max_wait_ms={max_wait_ms}")
+    print(f"[DDx Inference] Serving with {server} on {host}:{port}")
+    serve(server, host, port, workers, keep_alive)
@@ -1,46 +1,324 @@
 #!/usr/bin/env python3
+import os
 import sys
-import onnx
-import torch
-import gym
+import copy
+import json
+import time
 import numpy as np
 from stable_baselines3 import PPO
-from stable_baselines3.common.vec_env import DummyVecEnv
+from stable_baselines3.common.evaluation import evaluate_policy
+from stable_baselines3.common.monitor import Monitor
+from stable_baselines3.common.utils import LinearSchedule, set_random_seed
+from stable_baselines3.common.vec_env import DummyVecEnv, SubprocVecEnv, VecNormalize
+
+from ddx_market_data import MarketData
+from ddx_features import FEATURE_SET_VERSION
+from ddx_trading_env import ACTIONS, TradingEnv
+from ddx_portfolio_env import PortfolioTradingEnv
+from ddx_rng import spawn_seeds
+from ddx_vec_env import VecTradingEnv
+from ddx_shm_vec_env import ShmVecEnv
+from ddx_export import PARITY_SAMPLES, export_policy, policy_metadata, sample_observations
+from ddx_quantize import (MIN_AGREEMENT, MODES as QUANTIZE_MODES, load_observations, quantize, quantized_path,
+                          split_observations)
+from ddx_checkpoint import CheckpointCallback, CheckpointWriter, latest_checkpoint, load_checkpoint, restore
+
+VEC_BACKENDS = {"dummy": DummyVecEnv, "subproc": SubprocVecEnv, "shm": ShmVecEnv}
+MAX_STEPS = 200  # TradingEnv's episode length
+EVAL_EPISODES = 20
+
+
+def make_env_fn(env_cls, seed, **kwargs):
+    # Closure per env so each sub-env (possibly in another process) gets its own seed stream
+    return lambda: env_cls(seed=seed, **kwargs)
+
+
+def load_train_state(path):
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_train_state(path, state):
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(state, f, indent=2)
+    os.replace(tmp, path)
+
+
+def warm_start_bar(previous, n_bars, features_path, normalize, max_steps=MAX_STEPS):
+    """First bar fine-tuning episodes may start at, or None if the previous run can't be warm-started from."""
+    if previous is None:
+        print("[DDx RL Train] No previous model to warm-start from, training from scratch")
+        return None
+    version = FEATURE_SET_VERSION if features_path else None
+    if previous["feature_set_version"] != version or previous["normalize"] != normalize:
+        print("[DDx RL Train] Previous model saw different observations, training from scratch")
+        return None
+    if previous["n_bars"] is None or previous["n_bars"] > n_bars:
+        print("[DDx RL Train] History doesn't extend the previous run's, training from scratch")
+        return None
+    # Episodes start at most one episode before the previously seen end, so they run into the new
+    # bars (the feature store's freshly appended rows); with few new bars the window reaches further
+    # back so that starts still vary
+    return max(0, min(previous["n_bars"] - max_steps, n_bars - 2 * max_steps))
+
+
+def evaluate(model, env_fn, obs_rms=None, episodes=EVAL_EPISODES):
+    # Mean return of the deterministic policy; the same env_fn replays the same episodes for every model
+    env = DummyVecEnv([lambda: Monitor(env_fn())])
+    if obs_rms is not None:
+        env = VecNormalize(env, training=False, norm_reward=False)
+        env.obs_rms = obs_rms
+    mean, _ = evaluate_policy(model, env, n_eval_episodes=episodes, deterministic=True)
+    env.close()
+    return float(mean)
 
-from ddx_trading_env import TradingEnv
 
 def main():
     episodes = 50000
     model_out = "ddx_model.onnx"
+    data_path = None
+    features_path = None
+    assets_path = None
+    action_mode = "discrete"
+    seed = None
+    n_envs = 1
+    vec_backend = "dummy"
+    checkpoint_dir = "checkpoints"
+    checkpoint_every = 10000
+    keep_checkpoints = 3
+    resume = "--resume" in sys.argv
+    normalize = "--normalize" in sys.argv
+    warm_start = "--warm-start" in sys.argv
+    export_heads = "--export-heads" in sys.argv
+    quantize_mode = None
+    calibration_path = None
+    min_agreement = MIN_AGREEMENT
+    warm_timesteps = 5000
+    warm_lr = 3e-5
+    warm_tolerance = 0.
     if "--episodes" in sys.argv:
         idx = sys.argv.index("--episodes") + 1
         episodes = int(sys.argv[idx])
     if "--model_out" in sys.argv:
         idx = sys.argv.index("--model_out") + 1
         model_out = sys.argv[idx]
+    if "--data" in sys.argv:
+        idx = sys.argv.index("--data") + 1
+        data_path = sys.argv[idx]
+    if "--features" in sys.argv:
+        idx = sys.argv.index("--features") + 1
+        features_path = sys.argv[idx]
+    if "--assets" in sys.argv:
+        idx = sys.argv.index("--assets") + 1
+        assets_path = sys.argv[idx]
+    if "--action-mode" in sys.argv:
+        idx = sys.argv.index("--action-mode") + 1
+        action_mode = sys.argv[idx]
+    if "--seed" in sys.argv:
+        idx = sys.argv.index("--seed") + 1
+        seed = int(sys.argv[idx])
+    if "--n-envs" in sys.argv:
+        idx = sys.argv.index("--n-envs") + 1
+        n_envs = int(sys.argv[idx])
+    if "--vec-backend" in sys.argv:
+        idx = sys.argv.index("--vec-backend") + 1
+        vec_backend = sys.argv[idx]
+    if vec_backend not in VEC_BACKENDS and vec_backend != "vec":
+        raise SystemExit(f"--vec-backend must be one of {sorted(VEC_BACKENDS) + ['vec']}, got {vec_backend!r}")
+    if "--checkpoint-dir" in sys.argv:
+        idx = sys.argv.index("--checkpoint-dir") + 1
+        checkpoint_dir = sys.argv[idx]
+    if "--checkpoint-every" in sys.argv:
+        idx = sys.argv.index("--checkpoint-every") + 1
+        checkpoint_every = int(sys.argv[idx])
+    if "--keep-checkpoints" in sys.argv:
+        idx = sys.argv.index("--keep-checkpoints") + 1
+        keep_checkpoints = int(sys.argv[idx])
+        if keep_checkpoints < 1:
+            raise SystemExit(f"--keep-checkpoints must be at least 1, got {keep_checkpoints}")
+    if "--quantize" in sys.argv:
+        idx = sys.argv.index("--quantize") + 1
+        quantize_mode = sys.argv[idx]
+        if quantize_mode not in QUANTIZE_MODES:
+            raise SystemExit(f"--quantize must be one of {list(QUANTIZE_MODES)}, got {quantize_mode!r}")
+    if "--calibration-data" in sys.argv:
+        idx = sys.argv.index("--calibration-data") + 1
+        calibration_path = sys.argv[idx]
+    if "--min-agreement" in sys.argv:
+        idx = sys.argv.index("--min-agreement") + 1
+        min_agreement = float(sys.argv[idx])
+    if "--warm-start-timesteps" in sys.argv:
+        idx = sys.argv.index("--warm-start-timesteps") + 1
+        warm_timesteps = int(sys.argv[idx])
+    if "--warm-start-lr" in sys.argv:
+        idx = sys.argv.index("--warm-start-lr") + 1
+        warm_lr = float(sys.argv[idx])
+    if "--warm-start-tolerance" in sys.argv:
+        idx = sys.argv.index("--warm-start-tolerance") + 1
+        warm_tolerance = float(sys.argv[idx])
+
+    # --resume continues from the newest checkpoint, with its seed unless --seed overrides it
+    checkpoint = None
+    if resume:
+        path = latest_checkpoint(checkpoint_dir)
+        if path is None:
+            print(f"[DDx RL Train] No checkpoint in {checkpoint_dir}, starting from scratch")
+        else:
+            checkpoint = load_checkpoint(path)
+            print(f"[DDx RL Train] Resuming from {path} at {checkpoint['num_timesteps']} timesteps")
+            if seed is None:
+                seed = checkpoint["seed"]
+    if seed is None:
+        # Fresh entropy, but logged (and stamped into the model) so the run can be replayed with --seed
+        seed = int(np.random.SeedSequence().generate_state(1)[0])
+    print(f"[DDx RL Train] Seed {seed}")
+    # Every env gets its own child stream; child n_envs seeds torch and the policy's sampling,
+    # child n_envs + 1 the warm-start evaluation episodes
+    env_seeds = spawn_seeds(seed, n_envs + 2)
+    set_random_seed(int(env_seeds[n_envs].generate_state(1)[0]))
+
+    # The SB3 policy, VecNormalize stats and a small state file are saved next to the ONNX model
+    # so the next run can warm-start from them
+    base = os.path.splitext(model_out)[0]
+    policy_path, stats_path, state_path = base + "_policy.zip", base + "_vecnormalize.pkl", base + "_train.json"
+    n_bars = MarketData(data_path).n_bars if data_path else None
+
+    # --warm-start fine-tunes the previous run's policy on episodes that reach bars appended since
+    # that run; a checkpoint found by --resume means a full run is already under way
+    start_bar = None
+    if warm_start:
+        if not data_path or assets_path:
+            raise SystemExit("--warm-start needs single-asset --data history")
+        previous = load_train_state(state_path) if os.path.exists(policy_path) else None
+        if previous is not None and previous["n_bars"] == n_bars:
+            print(f"[DDx RL Train] No bars appended since the last run, keeping {model_out}")
+            return
+        if checkpoint is None:
+            start_bar = warm_start_bar(previous, n_bars, features_path, normalize)
+
+    # 1. Setup environment (--data replays memory-mapped history instead of the random feed,
+    #    --features observes precomputed feature rows for that history,
+    #    --assets trades every asset directory under it as one portfolio;
+    #    --n-envs copies run under --vec-backend: dummy (in process), subproc (SB3 pipes),
+    #    shm (shared-memory workers) or vec (VecTradingEnv, single-asset only))
+    if assets_path:
+        probe = PortfolioTradingEnv(assets=assets_path)
+        asset_features = [os.path.join(features_path, n) for n in probe.names] if features_path else None
+
+    def build_env(start_bar=0):
+        print(f"[DDx RL Train] {n_envs} env(s) on the {vec_backend} backend")
+        if vec_backend == "vec":
+            if assets_path:
+                raise SystemExit("--vec-backend vec only supports single-asset training")
+            return VecTradingEnv(n_envs=n_envs, data=data_path, features=features_path, seed=env_seeds[0],
+                                 start_bar=start_bar)
+        if assets_path:
+            env_fns = [make_env_fn(PortfolioTradingEnv, env_seeds[i], assets=assets_path, features=asset_features,
+                                   action_mode=action_mode) for i in range(n_envs)]
+        else:
+            env_fns = [make_env_fn(TradingEnv, env_seeds[i], data=data_path, features=features_path,
+                                   start_bar=start_bar) for i in range(n_envs)]
+        return VEC_BACKENDS[vec_backend](env_fns)
+
+    # 2a. Warm start: a short run at a reduced learning rate (decaying linearly to a tenth of it), kept
+    #     only if it scores at least as well as the previous policy on the same episodes of recent data
+    model = None
+    if start_bar is not None:
+        print(f"[DDx RL Train] Warm start from {policy_path}: {n_bars - previous['n_bars']} new bar(s), "
+              f"episodes from bar {start_bar}, {warm_timesteps} timesteps at lr {warm_lr}")
+        env = build_env(start_bar)
+        if normalize:
+            env = VecNormalize.load(stats_path, env)
+        previous_model = PPO.load(policy_path)
+        previous_rms = copy.deepcopy(env.obs_rms) if normalize else None
+        model = PPO.load(policy_path, env=env, learning_rate=LinearSchedule(warm_lr, warm_lr / 10, 1.))
+        model.learn(total_timesteps=warm_timesteps)
+        eval_fn = make_env_fn(TradingEnv, env_seeds[n_envs + 1], data=data_path, features=features_path,
+                              start_bar=start_bar)
+        score = evaluate(model, eval_fn, env.obs_rms if normalize else None)
+        baseline = evaluate(previous_model, eval_fn, previous_rms)
+        print(f"[DDx RL Train] Evaluation on recent bars: fine-tuned {score:.4f}, previous {baseline:.4f}")
+        if score < baseline - warm_tolerance:
+            print("[DDx RL Train] Fine-tuned policy scored worse, falling back to full training")
+            env.close()
+            model = None
+
+    # 2b. Full training with PPO, checkpointing every --checkpoint-every timesteps from a background writer
+    if model is None:
+        env = build_env()
+        if normalize:
+            # Running mean/std of observations and returns; the stats are checkpointed and saved next to the model
+            env = VecNormalize(env)
+        model = PPO("MlpPolicy", env, verbose=1)
+        if checkpoint is not None:
+            restore(model, checkpoint)
+        writer = CheckpointWriter(checkpoint_dir, keep=keep_checkpoints)
+        callback = CheckpointCallback(writer, checkpoint_every, extra={"seed": seed})
+        remaining = episodes - model.num_timesteps
+        try:
+            if remaining > 0:
+                model.learn(total_timesteps=remaining, callback=callback, reset_num_timesteps=checkpoint is None)
+        finally:
+            writer.close()
+        start_bar = None
 
-    # 1. Setup environment
-    env = DummyVecEnv([lambda: TradingEnv()])
-
-    # 2. Train PPO
-    model = PPO("MlpPolicy", env, verbose=1)
-    model.learn(total_timesteps=episodes)
-
-    # 3. Export to ONNX
-    import torch
-    obs = env.reset()
-    dummy_input = torch.tensor(obs, dtype=torch.float32)
-    torch.onnx.export(
-        model.policy,
-        dummy_input,
-        model_out,
-        export_params=True,
-        opset_version=13,
-        do_constant_folding=True,
-        input_names=["obs"],
-        output_names=["action", "value"],
-    )
+    # 3. Export the deterministic actor to ONNX (int64 actions; --export-heads adds the logits and
+    #    value outputs), check it against the PyTorch policy on observations from the last rollout,
+    #    and save an ORT-optimized .ort copy for the bridge (ddx_export.py)
+    # Record a version for the bridge's /model (UTC export time and total timesteps), the seed (to replay
+    # the run), the feature set (so the inference bridge can reject mismatched observations) and the
+    # number of assets (so it can split the action head per asset)
+    props = {
+        "version": f"{time.strftime('%Y%m%dT%H%M%SZ', time.gmtime())}-{int(model.num_timesteps)}",
+        "training_seed": str(seed),
+    }
+    if features_path:
+        props["feature_set_version"] = FEATURE_SET_VERSION
+    if assets_path:
+        props["n_assets"] = str(probe.n_assets)
+    # Plus the input shape, action mapping and normalization stats the bridge validates requests against
+    props.update(policy_metadata(model.policy, ACTIONS, env if normalize else None))
+    obs_shape = env.observation_space.shape
+    if model.rollout_buffer.full:
+        obs = model.rollout_buffer.observations.reshape((-1,) + obs_shape)
+    else:
+        # Nothing was collected this run (--resume with no timesteps left)
+        obs = np.random.default_rng(seed).standard_normal((PARITY_SAMPLES,) + obs_shape)
+    obs = sample_observations(obs)
+    if normalize:
+        # The VecNormalize stats are folded into the graph, which then takes raw observations
+        obs = env.unnormalize_obs(obs).astype(np.float32)
+    export_policy(model.policy, obs, model_out, props, heads=export_heads, normalize=env if normalize else None)
+    if os.path.exists(quantized_path(model_out)):
+        # Quantized from the previous export, so it no longer matches the float model
+        os.remove(quantized_path(model_out))
+    if quantize_mode:
+        # Optional INT8 copy (<model>.int8.onnx), calibrated on recorded live observations
+        # (--calibration-data obs.npy) or half the rollout, and kept only if its actions agree with the
+        # float model's on rollout observations it wasn't calibrated on
+        if calibration_path:
+            calibration, evaluation = load_observations(calibration_path, obs_shape), obs
+        else:
+            calibration, evaluation = split_observations(obs)
+        quantize(model_out, quantize_mode, calibration, evaluation, min_agreement)
 
+    model.save(policy_path)
+    if normalize:
+        # Warm starts continue from these stats; the exported graph already has them folded in
+        env.save(stats_path)
+    env.close()
+    # Written last, so a failed run never marks its bars as trained on
+    save_train_state(state_path, {
+        "seed": seed,
+        "mode": "full" if start_bar is None else "warm",
+        "n_bars": n_bars,
+        "feature_set_version": FEATURE_SET_VERSION if features_path else None,
+        "normalize": normalize,
+        "timesteps": int(model.num_timesteps),
+    })
     print(f"[DDx RL Train] Model saved to {model_out}")
 
 if __name__ == "__main__":
@@ -12,6 +12,7 @@ echo "[DDx] Applying K8s manifests..."
 kubectl apply -f k8s/ddx-federated-backend.yaml
 kubectl apply -f k8s/ddx-redis.yaml
 kubectl apply -f k8s/ddx-agents.yaml
+kubectl apply -f k8s/ddx-inference.yaml
 kubectl apply -f k8s/ddx-frontend.yaml
 kubectl apply -f k8s/ddx-ingress.yaml
 kubectl apply -f k8s/ddx-hpa.yaml
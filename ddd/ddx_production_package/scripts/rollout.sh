@@ -1,5 +1,19 @@
 #!/usr/bin/env bash
 # rollout.sh - Trigger new model rollout
+#
+#   scripts/rollout.sh           restart the inference pods (new image / model baked in)
+#   scripts/rollout.sh --hot     ask every running bridge to hot-reload its model file
+#                                (the model path must be on a mounted volume)
+
+if [ "$1" == "--hot" ]; then
+    echo "[DDx] Hot-reloading inference model on running pods..."
+    for pod in $(kubectl get pods -l app=ddx-inference -o name); do
+        kubectl exec "$pod" -- python3 -c "import os, urllib.request; print(urllib.request.urlopen(urllib.request.Request('http://127.0.0.1:8500/reload', data=b'{}', method='POST', headers={'X-DDx-Admin-Token': os.environ.get('DDX_ADMIN_TOKEN', '')})).read().decode())" \
+            || echo "[DDx] Hot reload failed on $pod"
+    done
+    echo "[DDx] Hot reload done!"
+    exit 0
+fi
 
 echo "[DDx] Rolling out new inference model..."
 # This is a placeholder; actual steps might involve updating configMap with the new model path